@@ -1,7 +1,15 @@
 import requests
 import pandas as pd
 import logging
+import argparse
+import calendar
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import pytz
@@ -14,11 +22,26 @@ import os
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] [%(filename)s] %(message)s')
 logger = logging.getLogger(__name__)
 
+class PrometheusQueryError(Exception):
+    pass
+
 class PrometheusQuerier:
-    def __init__(self, prometheus_url, local_timezone='America/Toronto'):
+    # Prometheus rejects range queries returning more than 11000 points per series
+    MAX_POINTS_PER_QUERY = 11000
+
+    def __init__(self, prometheus_url, local_timezone='America/Toronto', step=1, max_workers=8, retries=5, backoff_factor=0.5):
         self.prometheus_url = prometheus_url
         self.local_timezone = local_timezone
         self.query_endpoint = f"{prometheus_url}/api/v1/query_range"
+        self.step = step
+        self.max_workers = max_workers
+
+        # pooled session, retrying connection errors and overloaded/unavailable responses with exponential backoff
+        retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=[429, 502, 503, 504],
+                      allowed_methods=["GET", "POST"])
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(max_retries=retry, pool_maxsize=max_workers))
+        self.session.mount("https://", HTTPAdapter(max_retries=retry, pool_maxsize=max_workers))
 
     def get_time_range(self, start_time_str=None, end_time_str=None):
         if start_time_str and end_time_str:
@@ -29,7 +52,7 @@ class PrometheusQuerier:
             end_time = utc_now.strftime('%Y-%m-%dT%H:%M:%SZ')
             start_time = (utc_now - timedelta(minutes=5)).strftime('%Y-%m-%dT%H:%M:%SZ')
         return start_time, end_time
-    
+
     @staticmethod
     def convert_local_to_utc(local_time_str, local_timezone='America/Toronto', output_format='%Y-%m-%dT%H:%M:%SZ'):
         local_time = datetime.strptime(local_time_str, '%Y-%m-%d %H:%M:%S')
@@ -37,64 +60,211 @@ class PrometheusQuerier:
         local_time = local_timezone_obj.localize(local_time)
         utc_time = local_time.astimezone(pytz.utc)
         return utc_time.strftime(output_format)
-    
-    def query_prometheus(self, query_string, start_time_str=None, end_time_str=None, chunk_size_hours=1):
-        # Initialize result dataframe
-        df_result = pd.DataFrame(columns=["timestamp", "value"])
 
+    @staticmethod
+    def to_epoch(utc_time_str):
+        return calendar.timegm(datetime.strptime(utc_time_str, '%Y-%m-%dT%H:%M:%SZ').timetuple())
+
+    def split_range(self, start, end):
+        """Split [start, end] (epoch seconds) into chunks of at most MAX_POINTS_PER_QUERY points, with no overlap."""
+        chunk_seconds = (self.MAX_POINTS_PER_QUERY - 1) * self.step
+        chunks = []
+        while start <= end:
+            chunk_end = min(start + chunk_seconds, end)
+            chunks.append((start, chunk_end))
+            start = chunk_end + self.step
+        return chunks
+
+    def fetch_chunk(self, query_string, start, end):
+        """
+        Fetch one chunk, splitting it in two if Prometheus still rejects it as too large.
+        Raises PrometheusQueryError if the query fails, so that no gap is silently left in the data.
+        """
+        data = {
+            'query': query_string,
+            'start': start,
+            'end': end,
+            'step': f"{self.step}s"
+        }
+        response = self.session.post(url=self.query_endpoint, data=data, verify=False).json()
+        if response.get("status") == "error" and "resolution" in response.get("error", "") and end - start >= 2 * self.step:
+            middle = start + (end - start) // (2 * self.step) * self.step
+            return pd.concat([self.fetch_chunk(query_string, start, middle),
+                              self.fetch_chunk(query_string, middle + self.step, end)], ignore_index=True)
+        if response.get("status") == "error":
+            raise PrometheusQueryError(f"Query of [{start}, {end}] failed: {response.get('error')}")
+        return self.extract_values(response)
+
+    def fetch_range(self, query_string, start, end):
+        """
+        Fetch [start, end] (epoch seconds) concurrently, yielding (chunk_end, chunk) in time order
+        as soon as the chunks are available.
+        At most 2 * max_workers chunks are in flight, to bound memory usage on long ranges.
+        """
+        chunks = self.split_range(start, end)
+        logger.info(f"Fetching {len(chunks)} chunks from {datetime.utcfromtimestamp(start)} to {datetime.utcfromtimestamp(end)} UTC")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque()
+            for chunk_start, chunk_end in chunks:
+                pending.append((chunk_end, executor.submit(self.fetch_chunk, query_string, chunk_start, chunk_end)))
+                if len(pending) >= 2 * self.max_workers:
+                    chunk_end, future = pending.popleft()
+                    yield chunk_end, future.result()
+            while pending:
+                chunk_end, future = pending.popleft()
+                yield chunk_end, future.result()
+
+    def get_epoch_range(self, start_time_str=None, end_time_str=None):
         start_time, end_time = self.get_time_range(start_time_str, end_time_str)
-        start_time = datetime.strptime(start_time, '%Y-%m-%dT%H:%M:%SZ')
-        end_time = datetime.strptime(end_time, '%Y-%m-%dT%H:%M:%SZ')
-        chunk_size_seconds = chunk_size_hours * 3600
-        
-        while start_time < end_time:
-            chunk_end_time = min(start_time + timedelta(seconds=chunk_size_seconds), end_time)
-            data = {
-                'query': query_string,
-                'start': start_time.strftime('%Y-%m-%dT%H:%M:%SZ'),
-                'end': chunk_end_time.strftime('%Y-%m-%dT%H:%M:%SZ'),
-                'step': '1s'
-            }
-            response = requests.post(url=self.query_endpoint, data=data, verify=False).json()
-            df_chunk = self.extract_values(response)
-            df_result = pd.concat([df_result, df_chunk], ignore_index=True)
-            start_time += timedelta(seconds=chunk_size_seconds)
-        
+        return self.to_epoch(start_time), self.to_epoch(end_time)
+
+    def query_prometheus(self, query_string, start_time_str=None, end_time_str=None):
+        start, end = self.get_epoch_range(start_time_str, end_time_str)
+        df_chunks = [df_chunk for _, df_chunk in self.fetch_range(query_string, start, end)]
+        df_result = pd.concat(df_chunks, ignore_index=True)
         df_result["value"] = pd.to_numeric(df_result["value"])
         return df_result
-    
+
+    def download(self, query_string, file_path, start, end, offset=None, on_chunk=None):
+        """
+        Fetch [start, end] (epoch seconds) into a CSV file, written chunk by chunk.
+        With offset, the file is truncated to offset bytes and appended to, instead of being rewritten.
+        on_chunk(chunk_end, offset) is called once each chunk is durably written.
+        Returns the number of rows written.
+        """
+        rows = 0
+        append = offset is not None and os.path.exists(file_path)
+        with open(file_path, "r+" if append else "w", newline="") as f:
+            if append:
+                f.truncate(offset)
+                f.seek(offset)
+            header = f.tell() == 0
+            for chunk_end, df_chunk in self.fetch_range(query_string, start, end):
+                df_chunk.to_csv(f, index=False, header=header)
+                header = False
+                f.flush()
+                os.fsync(f.fileno())
+                rows += df_chunk.shape[0]
+                if on_chunk:
+                    on_chunk(chunk_end, f.tell())
+        return rows
+
+    @staticmethod
+    def format_labels(metric):
+        """Labels of a series as a Prometheus selector string, e.g. {seid="1",snssai="1-000001"}."""
+        return "{" + ",".join(f'{name}="{value}"' for name, value in sorted(metric.items())) + "}"
+
     @staticmethod
     def extract_values(prometheus_response):
+        """Returns all the series of the response in long format: timestamp, value, labels."""
         if prometheus_response["status"] == "error":
-            logger.error("Error in Prometheus response!")
-            return pd.DataFrame(columns=["timestamp", "value"])
+            logger.error(f"Error in Prometheus response: {prometheus_response.get('error')}")
+            return pd.DataFrame(columns=["timestamp", "value", "labels"])
         else:
             if not prometheus_response["data"]["result"]:
                 logger.warning("Empty result in Prometheus response!")
-                return pd.DataFrame(columns=["timestamp", "value"])
-            result = prometheus_response["data"]["result"][0]["values"]
-            return pd.DataFrame(result, columns=["timestamp", "value"])
+                return pd.DataFrame(columns=["timestamp", "value", "labels"])
+            df_series = []
+            for series in prometheus_response["data"]["result"]:
+                df = pd.DataFrame(series["values"], columns=["timestamp", "value"])
+                df["labels"] = PrometheusQuerier.format_labels(series["metric"])
+                df_series.append(df)
+            return pd.concat(df_series, ignore_index=True)
+
+def load_checkpoint(path):
+    """Returns {query_name: {"query", "last_timestamp", "offset"}}, the progress of every query of the scenario."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
 
-def main():
+def save_checkpoint(path, checkpoint):
+    # write then rename, so that an interruption never leaves a partial checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+def collect(querier, scenario, queries, incremental, end=None):
+    """
+    Collect the queries of the scenario into data/<scenario>/<query>.csv.
+    In incremental mode, only the data after the last checkpointed timestamp is fetched and appended.
+    Returns True if every query is complete up to the end time of the scenario.
+    """
+    scenario_dir = f"data/{scenario['name']}"
+    os.makedirs(scenario_dir, exist_ok=True)
+    checkpoint_path = f"{scenario_dir}/.checkpoint.json"
+    checkpoint = load_checkpoint(checkpoint_path)
+
+    scenario_start, scenario_end = querier.get_epoch_range(scenario.get("start_time"), scenario.get("end_time"))
+    if end is None:
+        end = scenario_end
+    elif scenario.get("end_time"):
+        end = min(end, scenario_end)
+
+    complete = end >= scenario_end
+    for name, query in queries.items():
+        file_path = f"{scenario_dir}/{name}.csv"
+        progress = checkpoint.get(name) if incremental else None
+        if progress and progress["query"] == query and os.path.exists(file_path):
+            start, offset = progress["last_timestamp"] + querier.step, progress["offset"]
+        else:
+            if progress:
+                logger.warning(f"Query or data of {name} changed, collecting it again")
+            start, offset = scenario_start, None
+
+        if start > end:
+            logger.info(f"{name} is up to date")
+            continue
+
+        def on_chunk(chunk_end, file_offset, name=name, query=query):
+            checkpoint[name] = {"query": query, "last_timestamp": chunk_end, "offset": file_offset}
+            save_checkpoint(checkpoint_path, checkpoint)
+
+        logger.info(f"Querying {name}")
+        try:
+            rows = querier.download(query, file_path, start, end, offset, on_chunk)
+        except (PrometheusQueryError, requests.exceptions.RequestException) as e:
+            logger.error(f"Failed to collect {name}, it will be resumed from its last checkpoint: {e}")
+            complete = False
+            continue
+        logger.info(f"Stored {rows} new rows for {name}")
+
+    return complete
+
+def main(scenario_name, max_workers, incremental, follow, follow_interval, follow_delay):
     prometheus_url = os.getenv("MONARCH_PROMETHEUS_URL")
-    querier = PrometheusQuerier(prometheus_url)
-    
+    querier = PrometheusQuerier(prometheus_url, max_workers=max_workers)
+
     queries = QUERIES  # This is a dictionary of queries to be executed
-    scenario = SCENARIOS["test_with_time"]
+    scenario = SCENARIOS[scenario_name]
     scenario_name = scenario["name"]
-    start_time = scenario.get("start_time")
-    end_time = scenario.get("end_time")
     kpis = scenario.get("kpis")
     queries = {k: v for k, v in queries.items() if k in kpis}
     logger.info(f"Scenario: {scenario_name}")
 
-    os.makedirs(f"data/{scenario_name}", exist_ok=True)
-    for name, query in queries.items():
-        logger.info(f"Querying {name}")
-        df = querier.query_prometheus(query, start_time, end_time)
-        df.to_csv(f"data/{scenario_name}/{name}.csv", index=False)
+    if not follow:
+        collect(querier, scenario, queries, incremental)
+        logger.info(f"Done! Stored data in data/{scenario_name}")
+        return
 
-    logger.info(f"Done! Stored data in data/{scenario_name}")
+    # tail live data, leaving follow_delay seconds for the samples to reach Prometheus/Thanos
+    while True:
+        end = int(time.time()) - follow_delay
+        if collect(querier, scenario, queries, incremental=True, end=end) and scenario.get("end_time"):
+            logger.info(f"Reached the end of the scenario, stored data in data/{scenario_name}")
+            return
+        time.sleep(follow_interval)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Collect the KPIs of a scenario from Prometheus.")
+    parser.add_argument("--scenario", default="test_with_time", choices=list(SCENARIOS), help="Scenario to collect. Default is test_with_time.")
+    parser.add_argument("--workers", type=int, default=8, help="Number of concurrent range queries. Default is 8.")
+    parser.add_argument("--incremental", action="store_true", help="Resume from data/<scenario>/.checkpoint.json and only fetch new data.")
+    parser.add_argument("--follow", action="store_true", help="Keep collecting new data as it arrives (implies --incremental).")
+    parser.add_argument("--follow-interval", type=int, default=60, help="Seconds between two collections in follow mode. Default is 60.")
+    parser.add_argument("--follow-delay", type=int, default=30, help="Only collect data older than this many seconds in follow mode. Default is 30.")
+    args = parser.parse_args()
+
+    main(args.scenario, args.workers, args.incremental, args.follow, args.follow_interval, args.follow_delay)
@@ -1,20 +1,29 @@
 import argparse
+import itertools
 import logging
 import os
-from src.sampling import FixedFrequencySampler, AdaptiveSampler
-from src.utils import mean_absolute_error, preprocess_data, truncate_df, pointwise_absolute_error, mean_absolute_percentage_error, compression_ratio
-from src.visualization import plot_timeseries, plot_error_timeseries, plot_distribution, plot_error_distribution, plot_psd, plot_error_timeseries_smooth, plot_timeseries_v2
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from src.sampling import FixedFrequencySampler, AdaptiveSampler, MultiSeriesFixedFrequencySampler, MultiSeriesAdaptiveSampler
+from src.utils import evaluate, evaluate_series, load_columns, preprocess_data, truncate_df
+from src.visualization import render_figures, plot_timeseries, plot_error_timeseries, plot_distribution, plot_error_distribution, plot_psd, plot_error_timeseries_smooth, plot_timeseries_v2
 import src.config as config
 import yaml
 
-def run(df, sampler):
-    """Run the sampling algorithm on the dataset."""
-    log_interval = 1000  # Log every N rows
-    for i, (timestamp, value) in enumerate(df.iterrows()):
-        sampler.sample(timestamp, value["value"])
+def to_arrays(df):
+    """Return the timestamps (int64 epoch nanoseconds) and values (float64) of the dataset as contiguous arrays."""
+    timestamps = np.ascontiguousarray(df.index.values.astype("datetime64[ns]").view(np.int64))
+    values = np.ascontiguousarray(df["value"].to_numpy(dtype=np.float64))
+    return timestamps, values
 
-        if i % log_interval == 0:
-            logging.info(f"Processed {i} rows.")
+def run(df, sampler, chunk_size=None):
+    """Replay the dataset through the sampling algorithm, chunk_size points at a time."""
+    timestamps, values = to_arrays(df)
+    chunk_size = chunk_size or max(len(timestamps), 1)
+    for start in range(0, len(timestamps), chunk_size):
+        sampler.sample_batch(timestamps[start:start + chunk_size], values[start:start + chunk_size])
+        logging.debug(f"Processed {min(start + chunk_size, len(timestamps))} rows.")
     return sampler.get_sampled_df()
 
 def load_dataset(file_path, truncate=False, truncate_date="2023-12-06 18:45:00", truncate_size=500):
@@ -26,7 +35,41 @@ def load_dataset(file_path, truncate=False, truncate_date="2023-12-06 18:45:00",
     logging.info(f"Loaded dataset with {df.shape[0]} rows.")
     return df
 
- 
+
+def main_multi_series(kpi_name, kpi_config):
+    """Run the sampling schemes on every series of a multi-series KPI (e.g. per SEID or per RNTI)."""
+    figures_dir = f"figures/{kpi_name}"
+    os.makedirs(figures_dir, exist_ok=True)
+
+    logging.basicConfig(level=logging.INFO)
+    labels, offsets, timestamps, values = load_columns(kpi_config["path"])
+    logging.info(f"Loaded dataset with {len(labels)} series and {timestamps.shape[0]} rows.")
+
+    samplers = {}
+    if settings["schemes"]["ff5"]:
+        samplers["ff5"] = MultiSeriesFixedFrequencySampler(frequency=5)
+    if settings["schemes"]["ff10"]:
+        samplers["ff10"] = MultiSeriesFixedFrequencySampler(frequency=10)
+    if settings["schemes"]["adaptive"]:
+        samplers["adaptive"] = MultiSeriesAdaptiveSampler(threshold=0.01)
+
+    per_series_metrics = []
+    for sampling_strategy, sampler in samplers.items():
+        logging.info(f"Using {type(sampler).__name__} ({sampling_strategy})...")
+        sampled = sampler.sample(timestamps, values, offsets)
+        per_series, overall = evaluate_series(labels, offsets, timestamps, values, sampled, kpi_config["scale_factor"])
+        per_series.insert(0, "scheme", sampling_strategy)
+        per_series_metrics.append(per_series)
+
+        compression, mape = overall["compression"], overall["mape"]
+        eru = compression / mape if mape else (np.inf if compression else 0.0)  # higher is better
+        print(f"{sampling_strategy: >10}: MAE {overall['mae']:.4f} | MAPE {overall['mape']:.4f} | RMSE {overall['rmse']:.4f} | "
+              f"Max Error {overall['max_error']:.4f} | Data Savings Ratio {overall['compression']:.2f} | ERU {eru:.4f}")
+
+    if per_series_metrics:
+        pd.concat(per_series_metrics, ignore_index=True).to_csv(f"{figures_dir}/series_metrics.csv", index=False)
+        logging.info(f"Wrote the metrics of every series to {figures_dir}/series_metrics.csv")
+
 def main(kpi_name, kpi_config):
 
     file_path = kpi_config["path"]
@@ -34,12 +77,19 @@ def main(kpi_name, kpi_config):
     os.makedirs(figures_dir, exist_ok=True)
 
     logging.basicConfig(level=logging.INFO)
-    df = load_dataset(file_path, truncate=True, truncate_size=300)
+    replay = settings.get("replay", {})
+    df = load_dataset(file_path,
+                      truncate=replay.get("truncate", False),
+                      truncate_date=replay.get("truncate_date", "2023-12-06 18:45:00"),
+                      truncate_size=replay.get("truncate_size", 300))
+    chunk_size = replay.get("chunk_size")
 
     sampled_dfs = {}
     sampled_mae = {}
     sampled_pointwise_errors = {}
     sampled_mape = {}
+    sampled_rmse = {}
+    sampled_max_error = {}
     compression_ratios = {}
 
     scale_factor = kpi_config["scale_factor"]
@@ -48,39 +98,42 @@ def main(kpi_name, kpi_config):
     if settings["schemes"]["ff5"]:
         logging.info("Using Fixed Frequency Sampler (5s)...")
         ff5_sampler = FixedFrequencySampler(frequency=5)
-        df_ff5 = run(df, ff5_sampler)
-        mean_ff5_error = mean_absolute_error(df, df_ff5, scale_factor)
+        df_ff5 = run(df, ff5_sampler, chunk_size)
+        metrics = evaluate(df, df_ff5, scale_factor)
         sampled_dfs["ff5"] = df_ff5
-        sampled_mae["ff5"] = mean_ff5_error
-        sampled_pointwise_errors["ff5"] = pointwise_absolute_error(df, df_ff5, scale_factor)
-        mape_ff5 = mean_absolute_percentage_error(df, df_ff5, scale_factor)
-        sampled_mape["ff5"] = mape_ff5
-        compression_ratios["ff5"] = compression_ratio(df, df_ff5)
+        sampled_mae["ff5"] = metrics["mae"]
+        sampled_pointwise_errors["ff5"] = metrics["absolute_errors"]
+        sampled_mape["ff5"] = metrics["mape"]
+        sampled_rmse["ff5"] = metrics["rmse"]
+        sampled_max_error["ff5"] = metrics["max_error"]
+        compression_ratios["ff5"] = metrics["compression"]
 
     if settings["schemes"]["ff10"]:
         logging.info("Using Fixed Frequency Sampler (10s)...")
         ff10_sampler = FixedFrequencySampler(frequency=10)
-        df_ff10 = run(df, ff10_sampler)
-        mean_ff10_error = mean_absolute_error(df, df_ff10, scale_factor)
+        df_ff10 = run(df, ff10_sampler, chunk_size)
+        metrics = evaluate(df, df_ff10, scale_factor)
         sampled_dfs["ff10"] = df_ff10
-        sampled_mae["ff10"] = mean_ff10_error
-        sampled_pointwise_errors["ff10"] = pointwise_absolute_error(df, df_ff10, scale_factor)
-        mape_ff10 = mean_absolute_percentage_error(df, df_ff10, scale_factor)
-        sampled_mape["ff10"] = mape_ff10
-        compression_ratios["ff10"] = compression_ratio(df, df_ff10)
+        sampled_mae["ff10"] = metrics["mae"]
+        sampled_pointwise_errors["ff10"] = metrics["absolute_errors"]
+        sampled_mape["ff10"] = metrics["mape"]
+        sampled_rmse["ff10"] = metrics["rmse"]
+        sampled_max_error["ff10"] = metrics["max_error"]
+        compression_ratios["ff10"] = metrics["compression"]
 
 
     if settings["schemes"]["adaptive"]:
         logging.info("Using Adaptive Sampler...")
         adaptive_push_sampler = AdaptiveSampler(threshold=0.01)  # increase == more compression
-        df_adaptive_push = run(df, adaptive_push_sampler)
-        mean_adaptive_push_error = mean_absolute_error(df, df_adaptive_push, scale_factor)
+        df_adaptive_push = run(df, adaptive_push_sampler, chunk_size)
+        metrics = evaluate(df, df_adaptive_push, scale_factor)
         sampled_dfs["adaptive"] = df_adaptive_push
-        sampled_mae["adaptive"] = mean_adaptive_push_error
-        sampled_pointwise_errors["adaptive"] = pointwise_absolute_error(df, df_adaptive_push, scale_factor)
-        mape_adaptive_push = mean_absolute_percentage_error(df, df_adaptive_push, scale_factor)
-        sampled_mape["adaptive"] = mape_adaptive_push
-        compression_ratios["adaptive"] = compression_ratio(df, df_adaptive_push)
+        sampled_mae["adaptive"] = metrics["mae"]
+        sampled_pointwise_errors["adaptive"] = metrics["absolute_errors"]
+        sampled_mape["adaptive"] = metrics["mape"]
+        sampled_rmse["adaptive"] = metrics["rmse"]
+        sampled_max_error["adaptive"] = metrics["max_error"]
+        compression_ratios["adaptive"] = metrics["compression"]
 
     
 
@@ -90,6 +143,12 @@ def main(kpi_name, kpi_config):
     for sampling_strategy, sampled_df in sampled_dfs.items():
         print(f"MAPE: {sampling_strategy: >10}: {sampled_mape[sampling_strategy]:.4f}")
 
+    for sampling_strategy, sampled_df in sampled_dfs.items():
+        print(f"RMSE: {sampling_strategy: >10}: {sampled_rmse[sampling_strategy]:.4f}")
+
+    for sampling_strategy, sampled_df in sampled_dfs.items():
+        print(f"Max Error: {sampling_strategy: >10}: {sampled_max_error[sampling_strategy]:.4f}")
+
     for sampling_strategy, sampled_df in sampled_dfs.items():
         print(f"Data Savings Ratio: {sampling_strategy: >10}: {compression_ratios[sampling_strategy]:.2f}")
 
@@ -111,80 +170,164 @@ def main(kpi_name, kpi_config):
 
 
     if sampled_dfs:
+        # independent figures are rendered in parallel worker processes
+        figures = []
 
         if settings["plots"]["timeseries"]:
-            plot_timeseries_v2(
+            figures.append((plot_timeseries_v2, dict(
             original_df=df, 
-            sampled_df_list=sampled_dfs.values(), 
-            sampled_df_labels=sampled_dfs.keys(), 
+            sampled_df_list=list(sampled_dfs.values()), 
+            sampled_df_labels=list(sampled_dfs.keys()), 
             x_label="Time (seconds)", 
             y_label=y_label, 
             title="Timeseries Comparison", 
             filename=f'{figures_dir}/timeseries.pdf',
-            scale_factor=scale_factor)
+            scale_factor=scale_factor)))
 
         if settings["plots"]["distribution"]:
-            plot_distribution(
+            figures.append((plot_distribution, dict(
             original_df=df,
-            sampled_df_list=sampled_dfs.values(),
-            sampled_df_labels=sampled_dfs.keys(),
+            sampled_df_list=list(sampled_dfs.values()),
+            sampled_df_labels=list(sampled_dfs.keys()),
             x_label="Sampling Strategy",
             y_label=y_label,
             title="Distribution Comparison",
             filename=f'{figures_dir}/distribution.png',
-            scale_factor=scale_factor)
+            scale_factor=scale_factor)))
 
         if settings["plots"]["error_timeseries"]:
-            plot_error_timeseries(
-            error_list=sampled_pointwise_errors.values(),
-            error_labels=sampled_pointwise_errors.keys(),
+            figures.append((plot_error_timeseries, dict(
+            error_list=list(sampled_pointwise_errors.values()),
+            error_labels=list(sampled_pointwise_errors.keys()),
             x_label="Time (seconds)",
             y_label="Absolute Error",
             title="Error Comparison",
-            filename=f'{figures_dir}/error_timeseries.png')
+            filename=f'{figures_dir}/error_timeseries.png')))
 
         if settings["plots"]["error_timeseries_smooth"]:
-            plot_error_timeseries_smooth(
-            error_list=sampled_pointwise_errors.values(),
-            error_labels=sampled_pointwise_errors.keys(),
+            figures.append((plot_error_timeseries_smooth, dict(
+            error_list=list(sampled_pointwise_errors.values()),
+            error_labels=list(sampled_pointwise_errors.keys()),
             x_label="Time (seconds)",
             y_label="Absolute Error",
             title="Error Comparison",
             filename=f'{figures_dir}/error_timeseries_smooth.pdf',
             smoothing_window=5,
             subplots=False
-            )
+            )))
         
         if settings["plots"]["error_distribution"]:
-            plot_error_distribution(
-            error_list=sampled_pointwise_errors.values(),
-            error_labels=sampled_pointwise_errors.keys(),
+            figures.append((plot_error_distribution, dict(
+            error_list=list(sampled_pointwise_errors.values()),
+            error_labels=list(sampled_pointwise_errors.keys()),
             x_label="Sampling Strategy",
             y_label="Absolute Error",
             title="Error Distribution Comparison",
-            filename=f'{figures_dir}/error_distribution.png')
+            filename=f'{figures_dir}/error_distribution.png')))
 
         if settings["plots"]["psd"]:
-            plot_psd(
+            figures.append((plot_psd, dict(
             original_df=df,
-            sampled_df_list=sampled_dfs.values(),
-            sampled_df_labels=sampled_dfs.keys(),
+            sampled_df_list=list(sampled_dfs.values()),
+            sampled_df_labels=list(sampled_dfs.keys()),
             x_label="Frequency (Hz)",
             y_label="Power/Frequency (dB/Hz)",
             title="Power Spectral Density Comparison",
             filename=f'{figures_dir}/psd.png',
-            scale_factor=scale_factor) 
-        
+            scale_factor=scale_factor)))
+
+        render_figures(figures, max_workers=settings["plots"].get("workers"))
+
+
+# datasets shared read-only by the sweep workers, {kpi_name: (df, scale_factor)}
+SWEEP_DATASETS = {}
+
+def init_sweep_worker(datasets):
+    """Receive the datasets once per worker process, rather than once per job."""
+    SWEEP_DATASETS.update(datasets)
+
+def run_sweep_job(kpi_name, scheme, params, chunk_size):
+    """Evaluate one sampling scheme with one parameter set on one KPI."""
+    df, scale_factor = SWEEP_DATASETS[kpi_name]
+    if scheme == "adaptive":
+        sampler = AdaptiveSampler(**params)
+    else:
+        sampler = FixedFrequencySampler(**params)
+    sampled_df = run(df, sampler, chunk_size)
+
+    metrics = evaluate(df, sampled_df, scale_factor)
+    mape, compression = metrics["mape"], metrics["compression"]
+    return {
+        "kpi": kpi_name,
+        "scheme": scheme,
+        **params,
+        "mae": metrics["mae"],
+        "mape": mape,
+        "rmse": metrics["rmse"],
+        "max_error": metrics["max_error"],
+        "compression": compression,
+        "eru": compression / mape if mape else (np.inf if compression else 0.0),  # higher is better
+    }
+
+def sweep(settings):
+    """Evaluate every AdaptiveSampler parameter set of the sweep grid on every enabled KPI in parallel."""
+    sweep_settings = settings["sweep"]
+    replay = settings.get("replay", {})
+
+    datasets = {}
+    for kpi_name, kpi_config in settings["kpi"].items():
+        if kpi_config["enabled"]:
+            df = load_dataset(kpi_config["path"],
+                              truncate=replay.get("truncate", False),
+                              truncate_date=replay.get("truncate_date", "2023-12-06 18:45:00"),
+                              truncate_size=replay.get("truncate_size", 300))
+            datasets[kpi_name] = (df, kpi_config["scale_factor"])
+
+    grid = sweep_settings["grid"]
+    parameter_sets = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    # fixed frequency baselines, for reference
+    baselines = [("fixed", {"frequency": frequency}) for frequency in sweep_settings.get("fixed_frequencies", [])]
+    jobs = [
+        (kpi_name, scheme, params)
+        for kpi_name in datasets
+        for scheme, params in baselines + [("adaptive", params) for params in parameter_sets]
+        if not (scheme == "adaptive" and params.get("min_interval", 3) > params.get("max_interval", 10))
+    ]
+    logging.info(f"Running {len(jobs)} sweep jobs...")
+
+    with ProcessPoolExecutor(max_workers=sweep_settings.get("workers"),
+                             initializer=init_sweep_worker, initargs=(datasets,)) as executor:
+        futures = [executor.submit(run_sweep_job, *job, replay.get("chunk_size")) for job in jobs]
+        rows = [future.result() for future in futures]
+
+    columns = ["kpi", "scheme"] + (["frequency"] if baselines else []) + list(grid) + ["mae", "mape", "rmse", "max_error", "compression", "eru"]
+    results = pd.DataFrame(rows, columns=columns).sort_values(["kpi", "eru"], ascending=[True, False])
+    output = sweep_settings.get("output", "figures/sweep.csv")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    results.to_csv(output, index=False)
+    print(results.to_string(index=False))
+    logging.info(f"Wrote sweep results to {output}")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate the sampling schemes on the collected KPIs.")
+    parser.add_argument("--sweep", action="store_true", help="Run the AdaptiveSampler parameter sweep defined in settings.yaml.")
+    args = parser.parse_args()
 
     with open("settings.yaml", "r") as f:
         settings = yaml.safe_load(f)
 
+    if args.sweep:
+        logging.basicConfig(level=logging.INFO)
+        sweep(settings)
+        raise SystemExit(0)
+
     for kpi_name, kpi_config in settings["kpi"].items():
         if kpi_config["enabled"]:
             print(f"Running experiments for {kpi_name}...")
-            main(kpi_name, kpi_config)
+            if kpi_config.get("multi_series", False):
+                main_multi_series(kpi_name, kpi_config)
+            else:
+                main(kpi_name, kpi_config)
     
     
\ No newline at end of file
@@ -0,0 +1,168 @@
+"""
+Online adaptive sampling
+========================
+Runs the AdaptiveSampler on live KPI values and pushes the resulting collection intervals
+to the monitoring stack, so that scrape load and storage drop while the KPIs are stable.
+
+- KPI values are read from the /metrics endpoint of the KPI calculator (or any Prometheus exporter).
+- Every series (metric name + labels) gets its own StreamingAdaptiveSampler, with O(1) state.
+- Each target groups KPIs collected by the same MDE; its interval is the smallest interval
+  required by any of its series, and is pushed to the target's actuator when it changes.
+"""
+import argparse
+import logging
+import subprocess
+import time
+import requests
+import yaml
+from prometheus_client.parser import text_string_to_metric_families
+from src.sampling import StreamingAdaptiveSampler
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] [%(filename)s] %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class ScriptActuator:
+    """Sets the interval by running a script taking "<int>s" as argument, e.g. set_gnb_monitoring_interval.sh."""
+
+    def __init__(self, script):
+        self.script = script
+
+    def push(self, interval):
+        subprocess.run([self.script, f"{interval}s"], check=True, capture_output=True, text=True)
+
+
+class ServiceMonitorActuator:
+    """Sets the interval of the first endpoint of ServiceMonitors, picked up by the Prometheus operator."""
+
+    def __init__(self, servicemonitors, namespace="monarch"):
+        self.servicemonitors = servicemonitors
+        self.namespace = namespace
+
+    def push(self, interval):
+        patch = f'[{{"op": "replace", "path": "/spec/endpoints/0/interval", "value": "{interval}s"}}]'
+        for servicemonitor in self.servicemonitors:
+            subprocess.run(["kubectl", "patch", "servicemonitor", servicemonitor, "-n", self.namespace,
+                            "--type=json", "-p", patch], check=True, capture_output=True, text=True)
+
+
+ACTUATORS = {
+    "script": lambda config: ScriptActuator(config["script"]),
+    "servicemonitor": lambda config: ServiceMonitorActuator(config["servicemonitors"], config.get("namespace", "monarch")),
+}
+
+
+class Target:
+    """KPIs collected by the same MDE, sharing one collection interval."""
+
+    def __init__(self, name, config, sampler_params, min_push_interval, dry_run):
+        self.name = name
+        self.kpis = set(config["kpis"])
+        self.actuator = ACTUATORS[config["actuator"]](config)
+        self.sampler_params = sampler_params
+        self.min_push_interval = min_push_interval
+        self.dry_run = dry_run
+        self.samplers = {}  # {(name, sorted label items): StreamingAdaptiveSampler}
+        self.last_seen = {}  # {(name, sorted label items): epoch nanoseconds}
+        self.interval = None
+        self.last_push = -float("inf")
+
+    def sample(self, name, labels, value, timestamp):
+        """Feed one KPI value, timestamp in epoch nanoseconds."""
+        key = (name, tuple(sorted(labels.items())))
+        sampler = self.samplers.get(key)
+        if sampler is None:
+            sampler = self.samplers[key] = StreamingAdaptiveSampler(**self.sampler_params)
+        sampler.sample(timestamp, value)
+        self.last_seen[key] = timestamp
+
+    def evict(self, now, ttl):
+        """Drop the samplers of series that have not been seen for ttl nanoseconds."""
+        for key, last_seen in list(self.last_seen.items()):
+            if now - last_seen > ttl:
+                del self.samplers[key]
+                del self.last_seen[key]
+
+    def update_interval(self, now):
+        """Push the smallest interval required by the series, if it changed."""
+        if not self.samplers:
+            return
+        interval = min(sampler.sampling_interval for sampler in self.samplers.values())
+        if interval == self.interval:
+            return
+        # faster collection is pushed right away, slower collection at most every min_push_interval
+        if self.interval is not None and interval > self.interval and now - self.last_push < self.min_push_interval:
+            return
+
+        logger.info(f"{self.name}: collection interval {self.interval or '-'}s -> {interval}s ({len(self.samplers)} series)")
+        if not self.dry_run:
+            try:
+                self.actuator.push(interval)
+            except (subprocess.CalledProcessError, OSError) as e:
+                logger.error(f"{self.name}: failed to push interval: {e}")
+                return
+        self.interval = interval
+        self.last_push = now
+
+
+def read_kpis(session, url, timeout):
+    """Returns the (name, labels, value) of every sample exposed by the endpoint."""
+    response = session.get(url, timeout=timeout)
+    response.raise_for_status()
+    return [
+        (sample.name, sample.labels, sample.value)
+        for family in text_string_to_metric_families(response.text)
+        for sample in family.samples
+    ]
+
+
+def run(settings):
+    sampler_params = {
+        param: settings[param]
+        for param in ["threshold", "min_interval", "max_interval", "increase_factor", "decrease_factor"]
+        if param in settings
+    }
+    targets = [
+        Target(name, config, sampler_params, settings.get("min_push_interval", 30), settings.get("dry_run", False))
+        for name, config in settings["targets"].items()
+    ]
+    targets_by_kpi = {kpi: target for target in targets for kpi in target.kpis}
+    poll_interval = settings.get("poll_interval", 1)
+    series_ttl = settings.get("series_ttl", 60)
+    session = requests.Session()
+
+    logger.info(f"Reading KPIs from {settings['metrics_url']} every {poll_interval}s")
+    next_poll = time.monotonic()
+    while True:
+        now = time.time_ns()
+        try:
+            samples = read_kpis(session, settings["metrics_url"], timeout=poll_interval)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Failed to read KPIs: {e}")
+            samples = []
+
+        for name, labels, value in samples:
+            target = targets_by_kpi.get(name)
+            if target is not None:
+                target.sample(name, labels, value, now)
+
+        for target in targets:
+            target.evict(now, series_ttl * 1e9)
+            target.update_interval(now / 1e9)
+
+        next_poll += poll_interval
+        time.sleep(max(0.0, next_poll - time.monotonic()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Adaptive sampling of live KPIs.")
+    parser.add_argument("--settings", default="settings.yaml", help="Settings file, the online section is used. Default is settings.yaml.")
+    parser.add_argument("--dry-run", action="store_true", help="Log the interval changes without pushing them.")
+    args = parser.parse_args()
+
+    with open(args.settings, "r") as f:
+        online_settings = yaml.safe_load(f)["online"]
+    if args.dry_run:
+        online_settings["dry_run"] = True
+
+    run(online_settings)
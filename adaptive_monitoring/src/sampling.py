@@ -1,63 +1,135 @@
-from datetime import datetime, timedelta
 from abc import ABC, abstractmethod
 import pandas as pd
 import numpy as np
 
 class BaseSampler(ABC):
-    def __init__(self):
-        self.sampled_df = pd.DataFrame(columns=['value'])
+    def __init__(self, initial_capacity=1024):
+        # sampled points are accumulated in preallocated arrays (epoch nanoseconds, values)
+        self._timestamps = np.empty(initial_capacity, dtype=np.int64)
+        self._values = np.empty(initial_capacity, dtype=np.float64)
+        self._size = 0
 
-    @abstractmethod
     def sample(self, timestamp, value):
-       pass
+        self._sample(pd.Timestamp(timestamp).value, value)
+
+    @abstractmethod
+    def _sample(self, timestamp, value):
+        """Sample one point, timestamp in epoch nanoseconds."""
+        pass
+
+    def sample_batch(self, timestamps, values):
+        """
+        Feed a chunk of points to the sampler.
+        timestamps: sorted int64 epoch nanoseconds, values: float64.
+        """
+        for timestamp, value in zip(np.asarray(timestamps, dtype=np.int64).tolist(),
+                                    np.asarray(values, dtype=np.float64).tolist()):
+            self._sample(timestamp, value)
+
+    def _reserve(self, n):
+        """Make room for n more points, growing the arrays geometrically."""
+        required = self._size + n
+        if required > self._timestamps.shape[0]:
+            capacity = max(required, 2 * self._timestamps.shape[0])
+            self._timestamps = np.resize(self._timestamps, capacity)
+            self._values = np.resize(self._values, capacity)
+
+    def _append(self, timestamp, value):
+        self._reserve(1)
+        self._timestamps[self._size] = timestamp
+        self._values[self._size] = value
+        self._size += 1
+
+    def _extend(self, timestamps, values):
+        n = len(timestamps)
+        self._reserve(n)
+        self._timestamps[self._size:self._size + n] = timestamps
+        self._values[self._size:self._size + n] = values
+        self._size += n
 
     def get_sampled_df(self):
-        return self.sampled_df
-    
+        """Build the DataFrame of the sampled points, indexed by timestamp."""
+        index = pd.DatetimeIndex(self._timestamps[:self._size].astype('datetime64[ns]'))
+        return pd.DataFrame({'value': self._values[:self._size].copy()}, index=index)
+
 
 class FixedFrequencySampler(BaseSampler):
     def __init__(self, frequency):
         super().__init__()
         self.frequency = frequency
-        self.last_sampled_timestamp = None
+        self.last_sampled_timestamp = None  # epoch nanoseconds
 
-    def sample(self, timestamp, value):
+    def _sample(self, timestamp, value):
         if self.last_sampled_timestamp is None \
-        or (timestamp - self.last_sampled_timestamp).total_seconds() >= self.frequency:
-            self.sampled_df.loc[timestamp] = {'value': value}  # Set 'timestamp' as the index
+        or timestamp - self.last_sampled_timestamp >= self.frequency * 1e9:
+            self._append(timestamp, value)
             self.last_sampled_timestamp = timestamp
 
+    def sample_batch(self, timestamps, values):
+        """
+        Vectorized equivalent of calling sample() on every point.
+        timestamps: sorted int64 epoch nanoseconds, values: float64.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        if timestamps.shape[0] == 0:
+            return
 
-class AdaptiveSampler(BaseSampler):
-    def __init__(self, threshold: float = 0.01) -> None:
-        super().__init__()
+        period = int(self.frequency * 1e9)
+        if self.last_sampled_timestamp is None:
+            start = 0
+        else:
+            start = np.searchsorted(timestamps, self.last_sampled_timestamp + period, side='left')
+
+        steps = np.diff(timestamps[start:])
+        if steps.shape[0] == 0 or (steps[0] > 0 and np.all(steps == steps[0])):
+            # evenly spaced points: every stride-th point is sampled
+            stride = max(1, -(-period // int(steps[0]))) if steps.shape[0] else 1
+            indices = np.arange(start, timestamps.shape[0], stride)
+        else:
+            # irregular points: jump from one sampled point to the next with a binary search
+            indices = []
+            while start < timestamps.shape[0]:
+                indices.append(start)
+                start = np.searchsorted(timestamps, timestamps[start] + period, side='left')
+            indices = np.asarray(indices, dtype=np.int64)
+
+        if indices.shape[0]:
+            self._extend(timestamps[indices], values[indices])
+            self.last_sampled_timestamp = int(timestamps[indices[-1]])
+
+
+class AdaptiveIntervalMixin:
+    """
+    Adaptive sampling algorithm shared by AdaptiveSampler and StreamingAdaptiveSampler: the sampling
+    interval shrinks on significant changes and grows otherwise. Sampled points are passed to _append().
+    """
+    def _init_adaptive(self, threshold: float = 0.01, min_interval: int = 3, max_interval: int = 10,
+                       increase_factor: float = 1.5, decrease_factor: float = 0.5) -> None:
         self.threshold = threshold
-        self.last_sampled_timestamp = None
+        self.last_sampled_timestamp = None  # epoch nanoseconds
         self.last_sampled_value = None
-        self.min_interval = 3
-        self.max_interval = 10
+        self.min_interval = min_interval
+        self.max_interval = max_interval
         self.sampling_interval = self.min_interval
         self.max_value = -np.inf
         self.min_value = np.inf
-        self.increase_factor = 1.5
-        self.decrease_factor = 0.5
+        self.increase_factor = increase_factor
+        self.decrease_factor = decrease_factor
 
     def sample_datapoint(self, timestamp, value):
 
         # sample the data point
-        self.sampled_df.loc[timestamp] = {'value': value}
+        self._append(timestamp, value)
         self.last_sampled_timestamp = timestamp
         self.last_sampled_value = value
 
         # update the min and max values
         self.max_value = max(self.max_value, value)
         self.min_value = min(self.min_value, value)
-       
-        
-    def sample(self, timestamp, value):
 
-        print(f"Sampling interval: {self.sampling_interval}")
 
+    def _sample(self, timestamp, value):
         if self.last_sampled_timestamp is None:
             self.sample_datapoint(timestamp, value)
             return
@@ -67,11 +139,13 @@ class AdaptiveSampler(BaseSampler):
             self.sample_datapoint(timestamp, value)
 
     def is_time_to_sample(self, timestamp):
-        elapsed_time = (timestamp - self.last_sampled_timestamp).total_seconds()
+        elapsed_time = (timestamp - self.last_sampled_timestamp) / 1e9
         return elapsed_time >= self.sampling_interval
-        
+
     def is_significant_change(self, value):
         change = abs(value - self.last_sampled_value)
+        if value == 0:
+            return change > 0
         relative_change = change / value
         # print(f"Relative Change: {relative_change:.6f}, Threshold: {self.threshold:.6f}")
         return relative_change > self.threshold
@@ -85,7 +159,125 @@ class AdaptiveSampler(BaseSampler):
             self.sampling_interval = min(self.max_interval, int(self.sampling_interval * self.increase_factor))
 
 
-    
+class AdaptiveSampler(AdaptiveIntervalMixin, BaseSampler):
+    def __init__(self, threshold: float = 0.01, min_interval: int = 3, max_interval: int = 10,
+                 increase_factor: float = 1.5, decrease_factor: float = 0.5) -> None:
+        super().__init__()
+        self._init_adaptive(threshold, min_interval, max_interval, increase_factor, decrease_factor)
+
+
+class StreamingAdaptiveSampler(AdaptiveIntervalMixin):
+    """
+    Adaptive sampling of a live series: only the O(1) sampling state is kept, sampled points are counted
+    but not stored. sampling_interval is the interval at which the series currently needs to be collected.
+    """
+    def __init__(self, threshold: float = 0.01, min_interval: int = 3, max_interval: int = 10,
+                 increase_factor: float = 1.5, decrease_factor: float = 0.5) -> None:
+        self._init_adaptive(threshold, min_interval, max_interval, increase_factor, decrease_factor)
+        self.sampled_points = 0
+
+    def sample(self, timestamp, value):
+        """Sample one point, timestamp in epoch nanoseconds."""
+        self._sample(timestamp, value)
+
+    def _append(self, timestamp, value):
+        self.sampled_points += 1
+
+
+class MultiSeriesSampler(ABC):
+    """
+    Runs a sampler independently on every series of a multi-series dataset in a single pass,
+    vectorized across series: the i-th point of every series is processed at once.
+    Series are stored back to back: series i is [offsets[i], offsets[i + 1]) of timestamps
+    (sorted int64 epoch nanoseconds) and values (float64).
+    """
+
+    @abstractmethod
+    def _reset(self, n_series):
+        """Initialize the state of n_series series."""
+        pass
+
+    @abstractmethod
+    def _step(self, n, timestamps, values):
+        """
+        Process the next point of the first n series (in state order), after their first point.
+        Returns the boolean mask of the sampled points.
+        """
+        pass
+
+    def sample(self, timestamps, values, offsets):
+        """Returns the boolean mask of the sampled points."""
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        lengths = np.diff(offsets)
+        sampled = np.zeros(timestamps.shape[0], dtype=bool)
+        if lengths.shape[0] == 0:
+            return sampled
+
+        # longest series first, so that the series still active at step i are a prefix of the state
+        order = np.argsort(-lengths, kind='stable')
+        starts = offsets[:-1][order]
+        negative_lengths = -lengths[order]
+        self._reset(lengths.shape[0])
+
+        # the first point of every series is always sampled
+        sampled[starts] = True
+        self.last_sampled_timestamp[:] = timestamps[starts]
+        self.last_sampled_value[:] = values[starts]
+        for i in range(1, lengths.max()):
+            n = np.searchsorted(negative_lengths, -i, side='left')  # number of series longer than i
+            indices = starts[:n] + i
+            sampled[indices] = self._step(n, timestamps[indices], values[indices])
+        return sampled
+
+
+class MultiSeriesFixedFrequencySampler(MultiSeriesSampler):
+    def __init__(self, frequency):
+        self.frequency = frequency
+
+    def _reset(self, n_series):
+        self.last_sampled_timestamp = np.zeros(n_series, dtype=np.int64)
+        self.last_sampled_value = np.zeros(n_series)
+
+    def _step(self, n, timestamps, values):
+        last_sampled_timestamp = self.last_sampled_timestamp[:n]
+        take = timestamps - last_sampled_timestamp >= self.frequency * 1e9
+        last_sampled_timestamp[take] = timestamps[take]
+        return take
+
+
+class MultiSeriesAdaptiveSampler(MultiSeriesSampler):
+    """Same algorithm as AdaptiveSampler, with one sampling interval per series."""
+
+    def __init__(self, threshold: float = 0.01, min_interval: int = 3, max_interval: int = 10,
+                 increase_factor: float = 1.5, decrease_factor: float = 0.5) -> None:
+        self.threshold = threshold
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.increase_factor = increase_factor
+        self.decrease_factor = decrease_factor
+
+    def _reset(self, n_series):
+        self.last_sampled_timestamp = np.zeros(n_series, dtype=np.int64)
+        self.last_sampled_value = np.zeros(n_series)
+        self.sampling_interval = np.full(n_series, float(self.min_interval))
+
+    def _step(self, n, timestamps, values):
+        last_sampled_timestamp = self.last_sampled_timestamp[:n]
+        last_sampled_value = self.last_sampled_value[:n]
+        sampling_interval = self.sampling_interval[:n]
 
+        change = np.abs(values - last_sampled_value)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            significant_change = np.where(values == 0, change > 0, change / values > self.threshold)
+        sampling_interval[:] = np.where(
+            significant_change,
+            np.maximum(self.min_interval, np.floor(sampling_interval * self.decrease_factor)),
+            np.minimum(self.max_interval, np.floor(sampling_interval * self.increase_factor)),
+        )
 
-   
+        take = (timestamps - last_sampled_timestamp) / 1e9 >= sampling_interval
+        last_sampled_timestamp[take] = timestamps[take]
+        last_sampled_value[take] = values[take]
+        return take
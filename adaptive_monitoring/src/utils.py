@@ -1,4 +1,6 @@
 from sklearn.metrics import mean_squared_error
+import glob
+import os
 import pandas as pd
 import numpy as np
 
@@ -66,17 +68,136 @@ def compression_ratio(original_df, sampled_df):
     compression_ratio = 1 - (sampled_rows / original_rows)
     return compression_ratio
 
-def preprocess_data(file_path, normalize=False):
-    """Preprocess the dataset for analysis."""
-    df = pd.read_csv(file_path)
-    df['date'] = pd.to_datetime(df['timestamp'], unit='s')
-    df.set_index('date', inplace=True)
-    df.drop(["timestamp"], inplace=True, axis=1)
-    df = df[~df.index.duplicated(keep='first')]
+def evaluate(df, sampled_df, scale_factor=1, epsilon=1e-8):
+    """
+    Evaluate a sampled DataFrame against the original one in a single pass.
+    The signal is reconstructed once on the original index by linear interpolation between
+    the sampled points (holding the last sampled value), as done by upscale_df.
+    Returns a dictionary with the MAE, MAPE, RMSE, max error, compression ratio and pointwise absolute errors.
+    """
+    original_timestamps = df.index.values.astype("datetime64[ns]").view(np.int64)
+    sampled_timestamps = sampled_df.index.values.astype("datetime64[ns]").view(np.int64)
+    values = df["value"].to_numpy(dtype=np.float64) / scale_factor
+    sampled_values = sampled_df["value"].to_numpy(dtype=np.float64) / scale_factor
+
+    if sampled_values.shape[0] == 0:
+        raise ValueError("The sampled DataFrame is empty.")
+    # relative to the first timestamp, to keep the precision of the float64 interpolation
+    origin = original_timestamps[0] if original_timestamps.shape[0] else 0
+    reconstructed = np.interp(original_timestamps - origin, sampled_timestamps - origin, sampled_values)
+
+    errors = values - reconstructed
+    absolute_errors = np.abs(errors)
+    return {
+        "mae": absolute_errors.mean(),
+        "mape": (np.abs(errors / (values + epsilon)) * 100).mean(),
+        "rmse": np.sqrt(np.mean(errors ** 2)),
+        "max_error": absolute_errors.max(),
+        "compression": compression_ratio(df, sampled_df),
+        "absolute_errors": absolute_errors,
+    }
+
+# columns of a parsed dataset, series are stored back to back: series i is [offsets[i], offsets[i + 1])
+COLUMNS = ["labels", "offsets", "timestamps", "values"]
+
+def parse_csv(file_path):
+    """
+    Parse a dataset in long format (timestamp, value and optionally labels, one row per sample of every series).
+    Returns the labels of every series, their offsets, and the int64 epoch nanoseconds and float64 values
+    of all series back to back, each series sorted by timestamp and without duplicate timestamps.
+    """
+    df = pd.read_csv(file_path, dtype={"labels": str}, keep_default_na=False)
+    if "labels" not in df.columns:
+        df["labels"] = "{}"  # single series
+    df["value"] = pd.to_numeric(df["value"], errors="coerce")
+    df["timestamp"] = pd.to_datetime(df["timestamp"], unit='s')
+    df = df.sort_values(["labels", "timestamp"], kind="stable")
+    df = df[~df.duplicated(["labels", "timestamp"], keep='first')]
+
+    labels, starts = np.unique(df["labels"].to_numpy(dtype=str), return_index=True)
+    offsets = np.append(starts, df.shape[0]).astype(np.int64)
+    timestamps = df["timestamp"].to_numpy().astype("datetime64[ns]").view(np.int64)
+    return labels, offsets, np.ascontiguousarray(timestamps), df["value"].to_numpy(dtype=np.float64)
+
+def load_columns(file_path, use_cache=True):
+    """
+    Load a dataset as (labels, offsets, timestamps, values) arrays, see parse_csv.
+    The parsed columns are cached as .npy files in a .cache folder next to the CSV, keyed by the
+    CSV modification time and size, and memory-mapped on later loads.
+    """
+    if not use_cache:
+        return parse_csv(file_path)
+
+    stat = os.stat(file_path)
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(file_path)), ".cache")
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    prefix = os.path.join(cache_dir, f"{name}-{stat.st_mtime_ns:x}-{stat.st_size:x}")
+
+    try:
+        return tuple(np.load(f"{prefix}.{column}.npy", mmap_mode='r') for column in COLUMNS)
+    except (FileNotFoundError, ValueError):
+        pass
+
+    arrays = parse_csv(file_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    # drop the cache of previous versions of the file
+    for stale in glob.glob(os.path.join(cache_dir, f"{glob.escape(name)}-*.npy")):
+        os.remove(stale)
+    for column, array in zip(COLUMNS, arrays):
+        # write then rename, so that a concurrent reader never sees a partial file
+        tmp_path = f"{prefix}.{column}.{os.getpid()}.tmp.npy"
+        np.save(tmp_path, array)
+        os.replace(tmp_path, f"{prefix}.{column}.npy")
+    return arrays
+
+def preprocess_data(file_path, normalize=False, use_cache=True, series=0):
+    """Preprocess one series of the dataset (by default the first one) for analysis."""
+    labels, offsets, timestamps, values = load_columns(file_path, use_cache)
+    start, end = offsets[series], offsets[series + 1]
+    df = pd.DataFrame({'value': values[start:end]},
+                      index=pd.DatetimeIndex(timestamps[start:end].view("datetime64[ns]"), name='date'))
     if normalize:
         df = normalize(df)
     return df
 
+def evaluate_series(labels, offsets, timestamps, values, sampled, scale_factor=1, epsilon=1e-8):
+    """
+    Evaluate the sampling of every series of a multi-series dataset, see evaluate.
+    sampled: boolean mask of the sampled points, as returned by the MultiSeries samplers.
+    Returns a DataFrame with the metrics of every series, and a dictionary with the metrics over all points.
+    """
+    if len(labels) == 0:
+        raise ValueError("The dataset is empty.")
+    errors = np.empty(timestamps.shape[0])
+    for i in range(len(labels)):
+        start, end = offsets[i], offsets[i + 1]
+        series_timestamps = timestamps[start:end] - timestamps[start]  # keep the precision of the float64 interpolation
+        series_sampled = sampled[start:end]
+        reconstructed = np.interp(series_timestamps, series_timestamps[series_sampled], values[start:end][series_sampled])
+        errors[start:end] = (values[start:end] - reconstructed) / scale_factor
+
+    absolute_errors = np.abs(errors)
+    percentage_errors = np.abs(errors / (np.asarray(values) / scale_factor + epsilon)) * 100
+    starts = offsets[:-1]
+    lengths = np.diff(offsets)
+    per_series = pd.DataFrame({
+        "labels": labels,
+        "points": lengths,
+        "mae": np.add.reduceat(absolute_errors, starts) / lengths,
+        "mape": np.add.reduceat(percentage_errors, starts) / lengths,
+        "rmse": np.sqrt(np.add.reduceat(errors ** 2, starts) / lengths),
+        "max_error": np.maximum.reduceat(absolute_errors, starts),
+        "compression": 1 - np.add.reduceat(sampled.astype(np.int64), starts) / lengths,
+    })
+    overall = {
+        "mae": absolute_errors.mean(),
+        "mape": percentage_errors.mean(),
+        "rmse": np.sqrt(np.mean(errors ** 2)),
+        "max_error": absolute_errors.max(),
+        "compression": 1 - sampled.sum() / sampled.shape[0],
+    }
+    return per_series, overall
+
 def normalize(df):
     """Normalize the dataset using min-max scaling."""
     return (df - df.min()) / (df.max() - df.min())
\ No newline at end of file
@@ -1,6 +1,9 @@
+import matplotlib
+matplotlib.use("Agg")  # figures are only saved to files, this also lets worker processes render them
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from itertools import cycle
 from mpl_toolkits.axes_grid1.inset_locator import inset_axes, zoomed_inset_axes, mark_inset
 
@@ -18,25 +21,62 @@ plt.rcParams.update({
     "legend.edgecolor": "black"
 })
 
+# maximum number of points drawn per line, beyond which lines are decimated
+MAX_PLOT_POINTS = 2000
+
+def decimate(x, y, max_points=MAX_PLOT_POINTS):
+    """
+    Min/max decimation: split the series into max_points // 2 buckets and keep the minimum and maximum
+    of each bucket (and the first and last points), so that peaks remain visible in the plots.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=np.float64)
+    n = y.shape[0]
+    if n <= max_points:
+        return x, y
+
+    buckets = max(1, max_points // 2)
+    bucket_size = -(-n // buckets)
+    # pad with the last value, which does not change the min/max of the last bucket
+    padded = np.concatenate([y, np.full(buckets * bucket_size - n, y[-1])]).reshape(buckets, bucket_size)
+    offsets = np.arange(buckets) * bucket_size
+    indices = np.concatenate([[0, n - 1], offsets + padded.argmin(axis=1), offsets + padded.argmax(axis=1)])
+    indices = np.unique(np.minimum(indices, n - 1))
+    return x[indices], y[indices]
+
+def _render(function, kwargs):
+    function(**kwargs)
+    plt.close("all")
+
+def render_figures(figures, max_workers=None):
+    """Render independent figures, given as (plot function, kwargs) pairs, in parallel worker processes."""
+    if len(figures) <= 1 or max_workers == 1:
+        for function, kwargs in figures:
+            _render(function, kwargs)
+        return
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for future in [executor.submit(_render, function, kwargs) for function, kwargs in figures]:
+            future.result()
+
 def plot_timeseries(original_df, sampled_df_list, sampled_df_labels, x_label, y_label, title, filename, scale_factor=1):
 
     fig_width = 6
     num_series = len(sampled_df_list) 
     fig_height = 2 * num_series
 
-    original_seconds = (original_df.index - original_df.index[0]).total_seconds()
+    original_seconds = (original_df.index - original_df.index[0]).total_seconds().to_numpy()
 
     fig, ax = plt.subplots(num_series, 1, sharex=True)
     for i, (sampled_series, label) in enumerate(zip(sampled_df_list, sampled_df_labels)):
 
         # Convert the sampled series index to seconds from start
-        sampled_seconds = (sampled_series.index - original_df.index[0]).total_seconds()
+        sampled_seconds = (sampled_series.index - original_df.index[0]).total_seconds().to_numpy()
 
-        original_values = original_df['value'] / scale_factor
-        sampled_values = sampled_series['value'] / scale_factor
+        original_values = (original_df['value'] / scale_factor).to_numpy()
+        sampled_values = (sampled_series['value'] / scale_factor).to_numpy()
 
-        ax[i].plot(original_seconds, original_values, label='original', linestyle='-', color='blue')
-        ax[i].plot(sampled_seconds, sampled_values, label=label, marker='.', linestyle='-', color='red')
+        ax[i].plot(*decimate(original_seconds, original_values), label='original', linestyle='-', color='blue')
+        ax[i].plot(*decimate(sampled_seconds, sampled_values), label=label, marker='.', linestyle='-', color='red')
         ax[i].set_ylabel(y_label)
         ax[i].legend(loc='best')
         ax[i].grid(True, linestyle='--', alpha=0.3)
@@ -51,19 +91,19 @@ def plot_timeseries_v2(original_df, sampled_df_list, sampled_df_labels, x_label,
     num_series = len(sampled_df_list)
     fig_height = 2 * num_series
 
-    original_seconds = (original_df.index - original_df.index[0]).total_seconds()
+    original_seconds = (original_df.index - original_df.index[0]).total_seconds().to_numpy()
 
     fig, ax = plt.subplots(num_series, 1, sharex=True, figsize=(fig_width, fig_height))
     for i, (sampled_series, label) in enumerate(zip(sampled_df_list, sampled_df_labels)):
 
         # Convert the sampled series index to seconds from start
-        sampled_seconds = (sampled_series.index - original_df.index[0]).total_seconds()
+        sampled_seconds = (sampled_series.index - original_df.index[0]).total_seconds().to_numpy()
 
-        original_values = original_df['value'] / scale_factor
-        sampled_values = sampled_series['value'] / scale_factor
+        original_values = (original_df['value'] / scale_factor).to_numpy()
+        sampled_values = (sampled_series['value'] / scale_factor).to_numpy()
 
-        ax[i].plot(original_seconds, original_values, label='original', linestyle='-', color='blue')
-        ax[i].plot(sampled_seconds, sampled_values, label=label, marker='.', linestyle='--', color='red', alpha=0.8)
+        ax[i].plot(*decimate(original_seconds, original_values), label='original', linestyle='-', color='blue')
+        ax[i].plot(*decimate(sampled_seconds, sampled_values), label=label, marker='.', linestyle='--', color='red', alpha=0.8)
         # ax[i].set_ylabel(y_label)
         ax[i].legend(loc='best')
         ax[i].grid(True, linestyle='--', alpha=0.3)
@@ -71,8 +111,11 @@ def plot_timeseries_v2(original_df, sampled_df_list, sampled_df_labels, x_label,
         if zoom_range:  # Add zoomed-in inset to the first subplot
             axins = zoomed_inset_axes(ax[i], zoom=3, loc='upper center')
             # axins = inset_axes(ax[i], width="40%", height="40%", loc='upper center', borderpad=2)
-            axins.plot(original_seconds, original_values, color='blue')
-            axins.plot(sampled_seconds, sampled_values, marker='.', linestyle='--', color='red', alpha=0.7)
+            # only the zoomed-in window is drawn in the inset, at full resolution
+            in_window = (original_seconds >= zoom_range[0] - 1) & (original_seconds <= zoom_range[1] + 1)
+            sampled_in_window = (sampled_seconds >= zoom_range[0] - 10) & (sampled_seconds <= zoom_range[1] + 10)
+            axins.plot(original_seconds[in_window], original_values[in_window], color='blue')
+            axins.plot(sampled_seconds[sampled_in_window], sampled_values[sampled_in_window], marker='.', linestyle='--', color='red', alpha=0.7)
 
             # Determine the range and add padding
             ymin, ymax = min(original_values[zoom_range[0]:zoom_range[1]]), max(original_values[zoom_range[0]:zoom_range[1]])
@@ -134,7 +177,7 @@ def plot_error_timeseries(error_list, error_labels, x_label, y_label, title, fil
 
     fig, ax = plt.subplots(num_series, figsize=(fig_width, fig_height), dpi=300)
     for i, (errors, label) in enumerate(zip(error_list, error_labels)):
-        ax[i].plot(errors, label=label)
+        ax[i].plot(*decimate(np.arange(len(errors)), errors), label=label)
         ax[i].set_xlabel(x_label)
         ax[i].set_ylabel(y_label)
         ax[i].set_title(title)
@@ -195,8 +238,9 @@ def plot_psd(original_df, sampled_df_list, sampled_df_labels, x_label, y_label,
     plt.savefig(filename, format='png', bbox_inches='tight', dpi=300)
 
 def moving_average(data, window_size):
-    """Calculate the moving average using a simple sliding window approach."""
-    return np.convolve(data, np.ones(window_size)/window_size, mode='valid')
+    """Calculate the moving average over a sliding window, in O(n) with cumulative sums."""
+    cumulative_sum = np.cumsum(np.concatenate([[0.0], np.asarray(data, dtype=np.float64)]))
+    return (cumulative_sum[window_size:] - cumulative_sum[:-window_size]) / window_size
 
 def plot_error_timeseries_smooth(error_list, error_labels, x_label, y_label, title, filename, smoothing_window=5, subplots=True):
     num_series = len(error_list)
@@ -225,7 +269,7 @@ def plot_error_timeseries_smooth(error_list, error_labels, x_label, y_label, tit
             ax = [ax]  # Ensure ax is iterable for a single series case
         for i, (errors, label) in enumerate(zip(smoothed_error_list, error_labels)):
             current_color = next(cycle_colors)
-            ax[i].plot(errors, label=label, color=current_color)
+            ax[i].plot(*decimate(np.arange(len(errors)), errors), label=label, color=current_color)
             ax[i].set_ylabel(y_label)
             ax[i].legend(loc='best')
             ax[i].grid(True, linestyle='--', alpha=0.6)
@@ -259,7 +303,7 @@ def plot_error_timeseries_smooth(error_list, error_labels, x_label, y_label, tit
         for errors, label in zip(smoothed_error_list, error_labels):
             current_color = next(cycle_colors)
             current_linestyle = next(cycle_linestyles)
-            ax.plot(errors, label=label, color=current_color, linestyle=current_linestyle, markersize=5)
+            ax.plot(*decimate(np.arange(len(errors)), errors), label=label, color=current_color, linestyle=current_linestyle, markersize=5)
 
         ax.set_ylabel(y_label)
         ax.set_xlabel(x_label)
@@ -0,0 +1,154 @@
+"""
+Benchmark of the KPI computation path of the standard and otel KPI calculators.
+Runs each calculator against the synthetic Thanos stand-in (fake_thanos.py) and reports
+cycle latency percentiles, HTTP queries per cycle, CPU time per cycle and peak RSS.
+Each calculator runs in its own subprocess, since both register metrics in the default registry.
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+import requests
+
+from fake_thanos import SyntheticNetwork, FakeThanos
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+CALCULATORS = {
+    "standard": os.path.join(BENCHMARK_DIR, "..", "standard", "app", "kpi_calculator.py"),
+    "otel": os.path.join(BENCHMARK_DIR, "..", "otel", "app", "kpi_calculator.py"),
+}
+
+
+def load_calculator(name):
+    """
+    Import a calculator as a module. Its logger is only set up under __main__, so set it here.
+    """
+    path = os.path.abspath(CALCULATORS[name])
+    sys.path.insert(0, os.path.dirname(path))
+    spec = importlib.util.spec_from_file_location(f"kpi_calculator_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.log = logging.getLogger(spec.name)
+    module.log.setLevel(logging.ERROR)
+    module.log.addHandler(logging.StreamHandler())
+    return module
+
+
+def get_query_count(url):
+    return requests.get(url + "/stats", timeout=5).json()["queries"]
+
+
+def run_worker(name, url, cycles, warmup):
+    """
+    Run `cycles` KPI computation cycles back to back and print the measurements as JSON.
+    """
+    calculator = load_calculator(name)
+
+    for _ in range(warmup):
+        calculator.run_kpi_computation()
+
+    latencies = np.empty(cycles)
+    cpu_times = np.empty(cycles)
+    queries_before = get_query_count(url)
+    for i in range(cycles):
+        start, cpu_start = time.perf_counter(), time.process_time()
+        calculator.run_kpi_computation()
+        latencies[i] = time.perf_counter() - start
+        cpu_times[i] = time.process_time() - cpu_start
+    queries = get_query_count(url) - queries_before
+
+    print(json.dumps({
+        "calculator": name,
+        "cycles": cycles,
+        "latency_p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "latency_p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "latency_p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "latency_max_ms": float(latencies.max() * 1000),
+        "queries_per_cycle": queries / cycles,
+        "cpu_per_cycle_ms": float(cpu_times.mean() * 1000),
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,  # KB on Linux
+    }))
+
+
+def run_benchmark(args):
+    network = SyntheticNetwork(args.slices, args.ues_per_slice, args.rntis)
+    fake = FakeThanos(network, args.latency_ms, args.jitter_ms).start()
+
+    env = dict(os.environ, MONARCH_THANOS_URL=fake.url, KPI_SOURCE="thanos",
+               RECORDING_RULES="true" if args.recording_rules else "false")
+    reports = []
+    for name in args.calculators:
+        output = subprocess.run(
+            [sys.executable, __file__, "--worker", name, "--url", fake.url,
+             "--cycles", str(args.cycles), "--warmup", str(args.warmup)],
+            env=env, cwd=BENCHMARK_DIR, capture_output=True, text=True, check=True,
+        ).stdout
+        reports.append(json.loads(output.strip().splitlines()[-1]))
+    fake.stop()
+    return reports
+
+
+def print_reports(reports):
+    columns = ["calculator", "latency_p50_ms", "latency_p95_ms", "latency_p99_ms", "latency_max_ms",
+               "queries_per_cycle", "cpu_per_cycle_ms", "max_rss_mb"]
+    print(" | ".join(f"{column:>17s}" for column in columns))
+    for report in reports:
+        print(" | ".join(
+            f"{report[column]:>17.2f}" if isinstance(report[column], float) else f"{report[column]:>17}"
+            for column in columns
+        ))
+
+
+def check_thresholds(reports, args):
+    """
+    Returns the list of threshold violations, used to catch regressions in CI.
+    """
+    violations = []
+    for report in reports:
+        if args.max_p99_ms is not None and report["latency_p99_ms"] > args.max_p99_ms:
+            violations.append(f"{report['calculator']}: p99 latency {report['latency_p99_ms']:.2f}ms > {args.max_p99_ms}ms")
+        if args.max_queries is not None and report["queries_per_cycle"] > args.max_queries:
+            violations.append(f"{report['calculator']}: {report['queries_per_cycle']:.1f} queries per cycle > {args.max_queries}")
+    return violations
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark of the KPI calculators against a synthetic Thanos.')
+    parser.add_argument('--calculators', nargs='+', default=list(CALCULATORS), choices=list(CALCULATORS), help='Calculators to benchmark. Default is all.')
+    parser.add_argument('--slices', type=int, default=2, help='Number of slices (SNSSAIs). Default is 2.')
+    parser.add_argument('--ues-per-slice', type=int, default=10, help='Number of SEIDs per slice. Default is 10.')
+    parser.add_argument('--rntis', type=int, default=20, help='Number of UE RNTIs at the gNB. Default is 20.')
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='Latency added to every query. Default is 5ms.')
+    parser.add_argument('--jitter-ms', type=float, default=2.0, help='Random extra latency, up to this value. Default is 2ms.')
+    parser.add_argument('--cycles', type=int, default=100, help='Number of measured KPI cycles. Default is 100.')
+    parser.add_argument('--warmup', type=int, default=5, help='Number of unmeasured warm-up cycles. Default is 5.')
+    parser.add_argument('--recording-rules', action='store_true', help='Let the standard calculator use the recording rules.')
+    parser.add_argument('--max-p99-ms', type=float, help='Fail if the p99 cycle latency of a calculator exceeds this value.')
+    parser.add_argument('--max-queries', type=float, help='Fail if a calculator issues more queries per cycle than this value.')
+    parser.add_argument('--output', help='Also write the results as JSON to this file.')
+    parser.add_argument('--worker', choices=list(CALCULATORS), help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.url, args.cycles, args.warmup)
+        raise SystemExit(0)
+
+    reports = run_benchmark(args)
+    print_reports(reports)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
+
+    violations = check_thresholds(reports, args)
+    for violation in violations:
+        print(f"FAIL: {violation}")
+    raise SystemExit(1 if violations else 0)
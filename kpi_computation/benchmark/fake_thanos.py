@@ -0,0 +1,202 @@
+"""
+Synthetic Thanos stand-in for benchmarking the KPI calculators.
+Serves /api/v1/query with realistic Open5GS (SMF/UPF) and OAI gNB series for a
+configurable number of slices, SEIDs and RNTIs, with optional latency injection.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+
+class SyntheticNetwork:
+    """
+    Deterministic model of the testbed: every SEID and RNTI has a constant byte rate,
+    so counters grow linearly with time and the expected KPIs are easy to check.
+    """
+
+    def __init__(self, slices=2, ues_per_slice=10, rntis=20):
+        self.snssais = [f"{i + 1}-{i + 1:06d}" for i in range(slices)]
+        self.seids = {}  # {seid: snssai}
+        for i, snssai in enumerate(self.snssais):
+            for j in range(ues_per_slice):
+                self.seids[str(i * ues_per_slice + j + 1)] = snssai
+        self.rntis = [f"{0x4601 + i:x}" for i in range(rntis)]
+        self.start_time = time.time()
+
+    def seid_rate(self, seid, direction):
+        """Bytes/sec of a SEID, downlink is 4x uplink."""
+        rate = 1e5 * (1 + int(seid) % 10)
+        return rate * 4 if direction == "downlink" else rate
+
+    def rnti_rate(self, index, metric):
+        """Bytes/sec of an RNTI, one UE out of five is idle."""
+        if index % 5 == 0:
+            return 0.0
+        rate = 5e4 * (1 + index % 7)
+        return rate * 4 if metric == "oai_gnb_mac_tx_bytes" else rate
+
+    def counter(self, rate, timestamp):
+        return rate * (timestamp - self.start_time)
+
+    def slice_throughput(self, direction, snssai, by_snssai, timestamp):
+        results = []
+        for seid, seid_snssai in self.seids.items():
+            if snssai and seid_snssai != snssai:
+                continue
+            metric = {"seid": seid}
+            if by_snssai:
+                metric["snssai"] = seid_snssai
+            results.append({"metric": metric, "value": [timestamp, str(self.seid_rate(seid, direction) * 8)]})
+        return results
+
+    def active_snssais(self, timestamp):
+        return [{"metric": {"snssai": snssai}, "value": [timestamp, "0"]} for snssai in self.snssais]
+
+    def gnb_metric(self, metric, timestamp):
+        if metric == "oai_gnb_l1_total_prbs":
+            return [{"metric": {"__name__": metric}, "value": [timestamp, "106"]}]
+
+        results = []
+        for i, rnti in enumerate(self.rntis):
+            if metric == "oai_gnb_mac_nprb":
+                value = 0 if i % 5 == 0 else 1 + i % 10
+            else:
+                value = self.counter(self.rnti_rate(i, metric), timestamp)
+            results.append({"metric": {"__name__": metric, "rnti": rnti}, "value": [timestamp, str(value)]})
+        return results
+
+    def mac_rate(self, metric, timestamp):
+        return [
+            {"metric": {"rnti": rnti}, "value": [timestamp, str(self.rnti_rate(i, metric))]}
+            for i, rnti in enumerate(self.rntis)
+        ]
+
+    def evaluate(self, query, timestamp):
+        """
+        Evaluate the subset of PromQL issued by the standard and otel calculators.
+        """
+        query = query.strip()
+        direction = "uplink" if "indatavolumen3upf" in query else "downlink"
+
+        if "group_right" in query:
+            # standard: "in" is uplink, otel: "out" is uplink, mirror their direction mappings
+            if query.startswith("sum by (seid) (rate(monarch_"):
+                direction = "downlink" if direction == "uplink" else "uplink"
+            snssai = re.search(r'snssai="([^"]+)"', query)
+            by_snssai = query.startswith("sum by (snssai, seid)")
+            return self.slice_throughput(direction, snssai.group(1) if snssai else None, by_snssai, timestamp)
+
+        match = re.fullmatch(r"monarch:slice_throughput_(uplink|downlink)", query)
+        if match:
+            return self.slice_throughput(match.group(1), None, True, timestamp)
+
+        if query.startswith("sum by (snssai)"):
+            return self.active_snssais(timestamp)
+
+        match = re.fullmatch(r'\{__name__=~"([^"]+)"\}', query)
+        if match:
+            return [result for metric in match.group(1).split("|") for result in self.gnb_metric(metric, timestamp)]
+
+        match = re.fullmatch(r'\{__name__=~"([^"]+)"\}\[\w+\]', query)
+        if match:
+            # range selector: the last two scrapes, every second
+            scrape_time = float(int(timestamp))
+            return [
+                {"metric": current["metric"], "values": [previous["value"], current["value"]]}
+                for metric in match.group(1).split("|")
+                for previous, current in zip(self.gnb_metric(metric, scrape_time - 1), self.gnb_metric(metric, scrape_time))
+            ]
+
+        match = re.fullmatch(r"rate\((oai_gnb_mac_(?:tx|rx)_bytes)\[\w+\]\)", query)
+        if match:
+            return self.mac_rate(match.group(1), timestamp)
+
+        if re.fullmatch(r"oai_gnb_\w+", query):
+            return self.gnb_metric(query, timestamp)
+
+        return []
+
+
+class FakeThanos:
+    def __init__(self, network, latency_ms=0.0, jitter_ms=0.0, host="127.0.0.1", port=0):
+        self.network = network
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.queries = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like Thanos
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, body):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = parse_qs(url.query)
+
+                if url.path == "/stats":
+                    self._send_json({"queries": fake.queries})
+                    return
+                if url.path != "/api/v1/query":
+                    self.send_error(404)
+                    return
+
+                with fake.lock:
+                    fake.queries += 1
+                delay_ms = fake.latency_ms + random.uniform(0, fake.jitter_ms)
+                if delay_ms > 0:
+                    time.sleep(delay_ms / 1000)
+
+                timestamp = float(params.get("time", [time.time()])[0])
+                results = fake.network.evaluate(params.get("query", [""])[0], timestamp)
+                self._send_json({"status": "success", "data": {"resultType": "vector", "result": results}})
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthetic Thanos /api/v1/query server.")
+    parser.add_argument("--port", type=int, default=10902, help="Port to listen on. Default is 10902.")
+    parser.add_argument("--slices", type=int, default=2, help="Number of slices (SNSSAIs).")
+    parser.add_argument("--ues-per-slice", type=int, default=10, help="Number of SEIDs per slice.")
+    parser.add_argument("--rntis", type=int, default=20, help="Number of UE RNTIs at the gNB.")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latency added to every query.")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random extra latency, up to this value.")
+    args = parser.parse_args()
+
+    network = SyntheticNetwork(args.slices, args.ues_per_slice, args.rntis)
+    fake = FakeThanos(network, args.latency_ms, args.jitter_ms, host="0.0.0.0", port=args.port)
+    print(f"Fake Thanos listening on {fake.url}")
+    fake.server.serve_forever()
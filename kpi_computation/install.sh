@@ -6,6 +6,7 @@ cd "$SCRIPT_DIR"
 set -o allexport; source ../.env; set +o allexport
 kubectl get namespace $NAMESPACE 2>/dev/null || kubectl create namespace $NAMESPACE
 envsubst < standard/kpi_calculator.yaml | kubectl apply -f -
+envsubst < standard/recording-rules.yaml | kubectl apply -f -
 
 print_success() {
     echo -e "\e[1;32m$1\e[0m"
@@ -13,6 +13,7 @@ import time
 import requests
 import prometheus_client as prom
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 from dotenv import load_dotenv
 
@@ -21,6 +22,8 @@ MONARCH_THANOS_URL = os.getenv("MONARCH_THANOS_URL")
 DEFAULT_UPDATE_PERIOD = 1
 UPDATE_PERIOD = int(os.environ.get('UPDATE_PERIOD', DEFAULT_UPDATE_PERIOD))
 EXPORTER_PORT = 9000
+QUERY_CONCURRENCY = int(os.getenv("QUERY_CONCURRENCY", 8))
+QUERY_TIMEOUT = float(os.getenv("QUERY_TIMEOUT", 5))
 TIME_RANGE = os.getenv("TIME_RANGE", "5s")
 
 
@@ -31,6 +34,12 @@ prom.REGISTRY.unregister(prom.PROCESS_COLLECTOR)
 prom.REGISTRY.unregister(prom.PLATFORM_COLLECTOR)
 prom.REGISTRY.unregister(prom.GC_COLLECTOR)
 
+# Keep-alive connection pool shared by all queries, sized to the number of concurrent queries
+SESSION = requests.Session()
+SESSION.mount("http://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=QUERY_CONCURRENCY))
+SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=QUERY_CONCURRENCY))
+QUERY_EXECUTOR = ThreadPoolExecutor(max_workers=QUERY_CONCURRENCY, thread_name_prefix="query")
+
 def query_prometheus(params, url):
     """
     Query Prometheus using requests and return value.
@@ -39,7 +48,7 @@ def query_prometheus(params, url):
     Returns: The result of the Prometheus query.
     """
     try:
-        r = requests.get(url + '/api/v1/query', params)
+        r = SESSION.get(url + '/api/v1/query', params=params, timeout=QUERY_TIMEOUT)
         data = r.json()
 
         results = data["data"]["result"]
@@ -104,6 +113,7 @@ def main():
     log.info(f"Monarch Thanos URL: {MONARCH_THANOS_URL}")
     log.info(f"Time range: {TIME_RANGE}")
     log.info(f"Update period: {UPDATE_PERIOD}")
+    log.info(f"Query concurrency: {QUERY_CONCURRENCY}, timeout: {QUERY_TIMEOUT}s")
     prom.start_http_server(EXPORTER_PORT)
 
     while True:
@@ -124,11 +134,17 @@ def run_kpi_computation():
     if not active_snssais:
         log.warning("No active SNSSAIs found")
         return
-    for snssai in active_snssais:
-        for direction in directions:
-            throughput_per_seid = get_slice_throughput_per_seid_and_direction(snssai, direction)
-            for seid, value in throughput_per_seid.items():
-                export_to_prometheus(snssai, seid, direction, value)
+
+    # all (snssai, direction) queries are independent, run them in parallel
+    futures = {
+        (snssai, direction): QUERY_EXECUTOR.submit(get_slice_throughput_per_seid_and_direction, snssai, direction)
+        for snssai in active_snssais
+        for direction in directions
+    }
+    for (snssai, direction), future in futures.items():
+        throughput_per_seid = future.result()
+        for seid, value in throughput_per_seid.items():
+            export_to_prometheus(snssai, seid, direction, value)
 
 
 if __name__ == "__main__":
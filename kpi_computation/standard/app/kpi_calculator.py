@@ -7,13 +7,19 @@
 Prometheus exporter which exports slice throughput KPI.
 For use with the 5G-MONARCH project and Open5GS.
 """
-from datetime import datetime, timedelta, timezone
 import os
+import re
+import json
 import logging
 import time
 import requests
 import prometheus_client as prom
 import argparse
+from array import array
+from string import Template
+from concurrent.futures import ThreadPoolExecutor
+from prometheus_client.core import GaugeMetricFamily
+from local_tsdb import RingBufferTSDB, scrape
 
 from dotenv import load_dotenv
 
@@ -21,22 +27,124 @@ load_dotenv()
 MONARCH_THANOS_URL = os.getenv("MONARCH_THANOS_URL")
 DEFAULT_UPDATE_PERIOD = 1
 UPDATE_PERIOD = int(os.environ.get('UPDATE_PERIOD', DEFAULT_UPDATE_PERIOD))
+# An explicitly set UPDATE_PERIOD applies to every KPI, overriding the registry default_period
+UPDATE_PERIOD_OVERRIDE = 'UPDATE_PERIOD' in os.environ
 EXPORTER_PORT = 9000
+KPI_REGISTRY_PATH = os.getenv("KPI_REGISTRY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "supported_kpis.json"))
+QUERY_CONCURRENCY = int(os.getenv("QUERY_CONCURRENCY", 8))
+QUERY_TIMEOUT = float(os.getenv("QUERY_TIMEOUT", 5))
 TIME_RANGE = os.getenv("TIME_RANGE", "1s")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(duration):
+    """
+    Parse a PromQL duration with a single unit (e.g. "500ms", "30s", "5m", "1h") into seconds.
+    """
+    match = re.fullmatch(r"(\d+)(ms|s|m|h)", duration.strip())
+    if match is None:
+        raise ValueError(f"Unsupported duration: {duration!r}, expected a number followed by one of {list(DURATION_UNITS)}")
+    return int(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+# Parsed once, invalid values are rejected at startup
+TIME_RANGE_SECONDS = parse_duration(TIME_RANGE)
+# Optional per-KPI cadence overriding the registry default_period, e.g. "saturation_percentage=1,slice_throughput=5"
+KPI_PERIODS = os.getenv("KPI_PERIODS", "")
+# Label sets not refreshed for this many cycles of their KPI are removed from the exporter
+SERIES_TTL_CYCLES = int(os.getenv("SERIES_TTL_CYCLES", 30))
+MAX_SERIES = int(os.getenv("MAX_SERIES", 10000))
+# Read pre-computed recording-rule series instead of evaluating the raw joins every cycle
+RECORDING_RULES = os.getenv("RECORDING_RULES", "false").lower() == "true"
+RECORDING_RULES_RETRY = float(os.getenv("RECORDING_RULES_RETRY", 60))
+RECORDING_RULES_GROUP_INTERVAL = "${MONARCH_MONITORING_INTERVAL}"
+# "thanos" queries Thanos every cycle, "scrape" scrapes SCRAPE_TARGETS into an in-memory TSDB and evaluates KPIs locally
+KPI_SOURCE = os.getenv("KPI_SOURCE", "thanos")
+SCRAPE_TARGETS = [target.strip() for target in os.getenv("SCRAPE_TARGETS", "").split(",") if target.strip()]
+LOCAL_TSDB_CAPACITY = int(os.getenv("LOCAL_TSDB_CAPACITY", 64))
 
 
 # Prometheus variables
-SLICE_THROUGHPUT = prom.Gauge('slice_throughput', 'throughput per slice (bits/sec)', ['snssai', 'seid', 'direction'])
-MAC_THROUGHPUT = prom.Gauge('mac_throughput', 'MAC throughput per UE RNTI (bits/sec)', ['rnti', 'direction'])
-NUMBER_UES = prom.Gauge('number_ues', 'Number of connected UEs in the gNB')
-SATURATION_PERCENTAGE = prom.Gauge('saturation_percentage', 'Percentage of total gNB PRBs currently scheduled (NPRB sum / total PRBs * 100)', ['rnti'])
-# SATURATION_PERCENTAGE = prom.Gauge('saturation_percentage', 'Percentage of total gNB PRBs currently scheduled (NPRB sum / total PRBs * 100)')
+KPI_CYCLE_QUERIES = prom.Gauge('kpi_cycle_queries', 'Number of Prometheus HTTP queries (or scrapes) issued in the last KPI cycle')
+KPI_CYCLE_LAG = prom.Gauge('kpi_cycle_lag_seconds', 'Delay between the scheduled deadline and the actual start of the last KPI cycle')
+KPI_CYCLE_DURATION = prom.Gauge('kpi_cycle_duration_seconds', 'Duration of the last KPI cycle')
+KPI_CYCLE_OVERRUNS = prom.Counter('kpi_cycle_overruns', 'KPI cycles that took longer than their period')
+KPI_CYCLE_SKIPPED_TICKS = prom.Counter('kpi_cycle_skipped_ticks', 'Missed KPI deadlines coalesced into a later cycle')
+KPI_SERIES_EVICTIONS = prom.Counter('kpi_series_evictions', 'Stale KPI label sets removed from the exporter', ['metric'])
 
 # get rid of bloat
 prom.REGISTRY.unregister(prom.PROCESS_COLLECTOR)
 prom.REGISTRY.unregister(prom.PLATFORM_COLLECTOR)
 prom.REGISTRY.unregister(prom.GC_COLLECTOR)
 
+# Keep-alive connection pool shared by all queries, sized to the number of concurrent queries
+SESSION = requests.Session()
+SESSION.mount("http://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=QUERY_CONCURRENCY))
+SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=QUERY_CONCURRENCY))
+QUERY_EXECUTOR = ThreadPoolExecutor(max_workers=QUERY_CONCURRENCY, thread_name_prefix="query")
+
+
+class KPISnapshotCollector:
+    """
+    Custom collector exporting a labelled KPI from the snapshot of its latest cycle.
+
+    The update path only touches plain dicts owned by the KPI loop. At the end of each cycle,
+    label sets not refreshed in the last max_age cycles (or, beyond max_series, the least recently
+    refreshed ones) are evicted, and the remaining series are published as an immutable
+    (label values, array of values) snapshot. Scrapes read the snapshot reference once,
+    so they never see a half-updated cycle and no per-series lock is taken.
+    """
+
+    def __init__(self, name, documentation, labelnames, max_age=SERIES_TTL_CYCLES, max_series=MAX_SERIES):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.max_age = max_age
+        self.max_series = max_series
+        self.generation = 0
+        self.series = {}  # {label values: (value, generation)}, least recently refreshed first
+        self.snapshot = ((), array('d'))
+
+    def update(self, values):
+        """
+        values: dictionary of the form {label values: value} computed in the current cycle.
+        """
+        for labelvalues, value in values.items():
+            self.series.pop(labelvalues, None)
+            self.series[labelvalues] = (value, self.generation)
+
+    def end_cycle(self):
+        """
+        Evict stale label sets and publish the snapshot of the current cycle.
+        Returns the number of evicted label sets.
+        """
+        evicted = 0
+        while self.series:
+            labelvalues, (_, generation) = next(iter(self.series.items()))
+            if self.generation - generation < self.max_age and len(self.series) <= self.max_series:
+                break
+            del self.series[labelvalues]
+            evicted += 1
+
+        self.generation += 1
+        self.snapshot = (tuple(self.series), array('d', (value for value, _ in self.series.values())))
+        log.info(f"Exported {len(self.series)} {self.name} series")
+        if evicted:
+            log.info(f"Evicted {evicted} stale {self.name} series")
+            KPI_SERIES_EVICTIONS.labels(metric=self.name).inc(evicted)
+        return evicted
+
+    def describe(self):
+        return [GaugeMetricFamily(self.name, self.documentation, labels=self.labelnames)]
+
+    def collect(self):
+        labels, values = self.snapshot
+        family = GaugeMetricFamily(self.name, self.documentation, labels=self.labelnames)
+        for labelvalues, value in zip(labels, values):
+            family.add_metric(labelvalues, value)
+        yield family
+
+
 def query_prometheus(params, url):
     """
     Query Prometheus using requests and return value.
@@ -45,7 +153,7 @@ def query_prometheus(params, url):
     Returns: The result of the Prometheus query.
     """
     try:
-        r = requests.get(url + '/api/v1/query', params)
+        r = SESSION.get(url + '/api/v1/query', params=params, timeout=QUERY_TIMEOUT)
         data = r.json()
 
         results = data["data"]["result"]
@@ -57,327 +165,536 @@ def query_prometheus(params, url):
         log.error(f"Failed to parse Prometheus response: {e}")
         log.warning("No data available!")
 
-def get_slice_throughput_per_seid_and_direction(snssai, direction):
+# Raw gNB MAC byte counters per direction
+MAC_DIRECTION_METRICS = {
+    "uplink": "oai_gnb_mac_rx_bytes",
+    "downlink": "oai_gnb_mac_tx_bytes"
+}
+
+
+class CounterRateEngine:
     """
-    Queries both the SMF and UPF to get the throughput per SEID and direction.
-    Returns a dictionary of the form {seid: value (bits/sec)}
+    Computes per-second rates of monotonic counters between consecutive scrapes, from the scrape
+    timestamps of their samples. Only the last sample and rate of each series are kept, so every
+    update is O(n) in the number of series.
+    Series are forgotten after max_age updates without samples, so that a failed or empty query
+    does not reset the rates.
     """
-    time_range = TIME_RANGE
-    throughput_per_seid = {}  # {seid: value (bits/sec)}
-
-    direction_mapping = {
-        "uplink": "indatavolumen3upf",
-        "downlink": "outdatavolumen3upf"
-    }
 
-    if direction not in direction_mapping:
-        log.error("Invalid direction")
-        return
+    def __init__(self, max_age=SERIES_TTL_CYCLES):
+        self.max_age = max_age
+        self.previous = {}  # {key: (timestamp, value, rate)}
+        self.age = {}  # {key: updates since the series was last seen}
+
+    def update(self, samples):
+        """
+        samples: iterable of (key, points) tuples, points being the (timestamp, value) samples
+        of the series in time order, e.g. the result of a range selector.
+        Series not scraped again since the previous update keep their last rate.
+        Returns a dictionary of the form {key: rate (per second)}
+        """
+        rates = {}
+        seen = set()
+        for key, points in samples:
+            if not points:
+                continue
+            seen.add(key)
+            timestamp, value = points[-1]
+            previous = self.previous.get(key)
+            if previous is None and len(points) >= 2:
+                previous = (points[-2][0], points[-2][1], None)
+            if previous is None:
+                self.previous[key] = (timestamp, value, None)
+                continue
+
+            elapsed = timestamp - previous[0]
+            if elapsed <= 0:
+                # no new scrape since the previous update
+                if previous[2] is not None:
+                    rates[key] = previous[2]
+                continue
+
+            delta = value - previous[1]
+            if delta < 0:
+                # counter reset (e.g. gNB restart): the counter restarted from zero since the previous sample
+                delta = value
+            rates[key] = delta / elapsed
+            self.previous[key] = (timestamp, value, rates[key])
+
+        for key in list(self.previous):
+            self.age[key] = 0 if key in seen else self.age.get(key, 0) + 1
+            if self.age[key] > self.max_age:
+                del self.previous[key]
+                del self.age[key]
+        return rates
+
+
+MAC_RATE_ENGINE = CounterRateEngine()
+
+class DeadlineScheduler:
+    """
+    Fires KPI groups at fixed deadlines on the monotonic clock, so that compute time
+    does not stretch the period. Deadlines missed while a cycle overran are coalesced
+    into a single run instead of being replayed back-to-back.
+    """
 
-    query = f'sum by (seid) (rate(fivegs_ep_n3_gtp_{direction_mapping[direction]}_seid[{time_range}]) * on (seid) group_right sum(fivegs_smffunction_sm_seid_session{{snssai="{snssai}"}}) by (seid, snssai)) * 8'
-    log.debug(query)
-    params = {'query': query}
-    results = query_prometheus(params, MONARCH_THANOS_URL)
+    def __init__(self, periods):
+        """
+        periods: dictionary of the form {kpi_name: period (seconds)}
+        """
+        self.periods = periods
+        now = time.monotonic()
+        self.deadlines = {kpi_name: now for kpi_name in periods}
+
+    def wait_for_next_cycle(self):
+        """
+        Sleep until the earliest deadline.
+        Returns the list of due KPIs, the lag behind the deadline (seconds) and the number of skipped ticks.
+        """
+        deadline = min(self.deadlines.values())
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        now = time.monotonic()
+        due_kpis = []
+        skipped_ticks = 0
+        for kpi_name, kpi_deadline in self.deadlines.items():
+            if kpi_deadline > now:
+                continue
+            period = self.periods[kpi_name]
+            missed = int((now - kpi_deadline) // period)
+            skipped_ticks += missed
+            self.deadlines[kpi_name] = kpi_deadline + (missed + 1) * period
+            due_kpis.append(kpi_name)
+
+        return due_kpis, now - deadline, skipped_ticks
+
+
+def get_kpi_periods():
+    """
+    Parse KPI_PERIODS, falling back to UPDATE_PERIOD if set, or to the registry default_period, for other KPIs.
+    Returns a dictionary of the form {kpi_name: period (seconds)}
+    """
+    periods = {kpi_name: kpi["period"] for kpi_name, kpi in KPIS.items()}
+    for item in filter(None, KPI_PERIODS.split(",")):
+        kpi_name, _, period = item.partition("=")
+        kpi_name = kpi_name.strip()
+        if kpi_name not in periods:
+            raise ValueError(f"Unknown KPI in KPI_PERIODS: {kpi_name}")
+        periods[kpi_name] = float(period)
+    return periods
+
+def build_query_plan(kpi_names):
+    """
+    Collapse all the queries needed by the given KPIs into a minimal set of PromQL expressions.
+    Queries shared by several KPIs (e.g. the MAC tx rate used by number_ues and saturation_percentage)
+    appear only once; results are demultiplexed locally by the KPI compute functions.
+    Returns a dictionary of the form {query_name: params}
+    """
+    plan = {}
+    now = time.monotonic()
+    for kpi_name in kpi_names:
+        for name, params in KPIS[kpi_name]["queries"].items():
+            record = RECORDED_QUERIES.get(name)
+            if RECORDING_RULES and record and now - MISSING_RECORDING_RULES.get(name, -RECORDING_RULES_RETRY) >= RECORDING_RULES_RETRY:
+                params = {"query": record}
+            plan[name] = params
+    for name, params in plan.items():
+        log.debug(f"{name}: {params['query']}")
+    return plan
+
+LOCAL_TSDB = RingBufferTSDB(capacity=LOCAL_TSDB_CAPACITY)
+
+
+def scrape_targets():
+    """
+    Scrape all SCRAPE_TARGETS in parallel into LOCAL_TSDB.
+    """
+    now = time.time()
+    futures = {url: QUERY_EXECUTOR.submit(scrape, SESSION, url, QUERY_TIMEOUT) for url in SCRAPE_TARGETS}
+    for url, future in futures.items():
+        try:
+            LOCAL_TSDB.ingest(future.result(), now)
+        except Exception as e:
+            log.error(f"Failed to scrape {url}: {e}")
 
-    if results:
-        for result in results:
-            seid = result["metric"]["seid"]
-            value = float(result["value"][1])
-            throughput_per_seid[seid] = value
+    evicted = LOCAL_TSDB.evict(2 * TIME_RANGE_SECONDS, now)
+    if evicted:
+        log.debug(f"Evicted {evicted} stale series from the local TSDB")
+    return now
 
-    return throughput_per_seid
+def local_selector(metrics, now):
+    return [
+        {"metric": dict(labels, __name__=metric), "value": [timestamp, value]}
+        for metric in metrics
+        for labels, timestamp, value in LOCAL_TSDB.latest(metric, TIME_RANGE_SECONDS, now)
+    ]
 
-def get_mac_throughput_per_rnti_and_direction(direction):
+def local_last_samples(metrics, now):
     """
-    Returns throughput per UE RNTI for the specified direction: 'uplink' or 'downlink'.
-    Uses Prometheus metrics: oai_gnb_mac_tx_bytes or oai_gnb_mac_rx_bytes
-    Returns a dictionary of the form {rnti: value (bits/sec)}
+    Range selector restricted to the last sample of every series, which is all the counter-rate engine needs.
     """
-    if direction == "downlink":
-        metric = "oai_gnb_mac_tx_bytes"
-    elif direction == "uplink":
-        metric = "oai_gnb_mac_rx_bytes"
-    else:
-        log.warning(f"Invalid MAC direction: {direction}")
-        return {}
+    return [
+        {"metric": dict(labels, __name__=metric), "values": [[timestamp, value]]}
+        for metric in metrics
+        for labels, timestamp, value in LOCAL_TSDB.latest(metric, TIME_RANGE_SECONDS, now)
+    ]
+
+def local_rate(metric, now):
+    return [
+        {"metric": labels, "value": [now, value]}
+        for labels, value in LOCAL_TSDB.rate(metric, TIME_RANGE_SECONDS, now)
+    ]
+
+def local_slice_throughput(metric, now):
+    """
+    Local equivalent of
+    sum by (snssai, seid) (rate(metric[TIME_RANGE]) * on (seid) group_right sum(fivegs_smffunction_sm_seid_session) by (seid, snssai)) * 8
+    """
+    rate_per_seid = {}
+    for labels, value in LOCAL_TSDB.rate(metric, TIME_RANGE_SECONDS, now):
+        rate_per_seid[labels.get("seid")] = rate_per_seid.get(labels.get("seid"), 0) + value
 
-    # query = f'rate({metric}[{TIME_RANGE}]) * 8'  # bytes/sec -> bits/sec
-    # log.debug(query)
-    # params = {'query': query}
-    # results = query_prometheus(params, MONARCH_THANOS_URL)
-
-    # throughput_per_rnti = {}
-    # if results:
-    #     for result in results:
-    #         rnti = result["metric"]["rnti"]
-    #         value = float(result["value"][1])
-    #         if rnti:
-    #             throughput_per_rnti[rnti] = value
-    # return throughput_per_rnti
-
-    utc = timezone.utc
-    end_time = datetime.now(utc)
-    start_time = end_time - timedelta(seconds=int(TIME_RANGE[:-1]))
-
-    end_data = query_prometheus({
-        "query": f"{metric}",
-        "time": end_time.replace(tzinfo=None).timestamp()
-    }, MONARCH_THANOS_URL)
-
-    start_data = query_prometheus({
-        "query": f"{metric}",
-        "time": start_time.replace(tzinfo=None).timestamp()
-    }, MONARCH_THANOS_URL)
-
-    # match RNTIs and compute throughput manually
-    throughput_per_rnti = {}
-
-    for result in end_data:
-        rnti = result["metric"]["rnti"]
-        end_value = float(result["value"][1])
-        start_value = next(
-            (float(r["value"][1]) for r in start_data if r["metric"]["rnti"] == rnti), None
-        )
-        if start_value is not None:
-            delta_bytes = end_value - start_value
-            bits_per_sec = (delta_bytes * 8) / int(TIME_RANGE[:-1])  # seconds
-            throughput_per_rnti[rnti] = bits_per_sec
-    return throughput_per_rnti 
-   
-def get_number_ues():
-    rntis = set()
-    metric = "oai_gnb_mac_tx_bytes"
-    
-    query = f'rate({metric}[{TIME_RANGE}])'
-    results = query_prometheus({'query': query}, MONARCH_THANOS_URL)
+    sessions = {}  # {(seid, snssai): value}
+    for labels, _, value in LOCAL_TSDB.latest("fivegs_smffunction_sm_seid_session", TIME_RANGE_SECONDS, now):
+        key = (labels.get("seid"), labels.get("snssai"))
+        sessions[key] = sessions.get(key, 0) + value
 
-    if not results:
-        log.warning("No rate results from oai_gnb_mac_tx_bytes for number_ues")
-        return 0
+    return [
+        {"metric": {"snssai": snssai, "seid": seid}, "value": [now, rate_per_seid[seid] * value * 8]}
+        for (seid, snssai), value in sessions.items()
+        if seid in rate_per_seid
+    ]
 
-    for result in results:
-        rnti = result["metric"].get("rnti")
-        value = float(result["value"][1])
-        log.debug(f"RNTI: {rnti}, rate: {value}")
-        if rnti and value > 0:
-            rntis.add(rnti)
 
-    count = len(rntis)
-    log.info(f"Found {count} active RNTIs (non-zero tx rate) for number_ues")
-    return count
+# Local evaluators of the registry queries, used when KPI_SOURCE is "scrape"
+LOCAL_QUERIES = {
+    "slice_throughput_uplink": lambda now: local_slice_throughput("fivegs_ep_n3_gtp_indatavolumen3upf_seid", now),
+    "slice_throughput_downlink": lambda now: local_slice_throughput("fivegs_ep_n3_gtp_outdatavolumen3upf_seid", now),
+    "gnb_counters": lambda now: local_selector(["oai_gnb_mac_nprb", "oai_gnb_l1_total_prbs"], now),
+    "mac_counters": lambda now: local_last_samples(["oai_gnb_mac_tx_bytes", "oai_gnb_mac_rx_bytes"], now),
+    "mac_tx_rate": lambda now: local_rate("oai_gnb_mac_tx_bytes", now),
+}
 
-def get_saturation_percentage():
+
+def execute_local_query_plan(plan):
     """
-    Compute gNB PRB saturation only for UEs with active traffic:
-    (sum of mac_nprb for active UEs) / (total PRBs from L1 stats) * 100
+    Scrape the MDEs once and evaluate the plan locally. Queries without a local
+    evaluator are still sent to Thanos, if MONARCH_THANOS_URL is set.
+    Returns a dictionary of the form {query_name: results} and the number of HTTP queries issued.
     """
-    active_rntis = set()
-    tx_bytes_query = f'rate(oai_gnb_mac_tx_bytes[{TIME_RANGE}])'
-    tx_results = query_prometheus({"query": tx_bytes_query}, MONARCH_THANOS_URL)
+    now = scrape_targets()
+    results = {name: LOCAL_QUERIES[name](now) for name in plan if name in LOCAL_QUERIES}
 
-    
-    if tx_results:
-        for result in tx_results:
-            rnti = result["metric"].get("rnti")
-            value = float(result["value"][1])
-            if rnti and value > 0:
-                active_rntis.add(rnti)
-    else:
-        log.warning("No active RNTIs found from tx_bytes rate")
-
-    log.info(f"Found {len(active_rntis)} active RNTIs (non-zero tx rate) for number_ues")
-    mac_nprb_query = "oai_gnb_mac_nprb"
-    nprb_results = query_prometheus({"query": mac_nprb_query}, MONARCH_THANOS_URL)
-
-    total_nprb = 0.0
-    if nprb_results:
-        for result in nprb_results:
-            try:
-                rnti = result["metric"]["rnti"]
-                if rnti in active_rntis:
-                    val = float(result["value"][1])
-                    total_nprb += val
-                    log.debug(f"NPRB for active RNTI {rnti}: {val}")
-            except (KeyError, ValueError) as e:
-                log.warning(f"Failed to parse NPRB result: {e}")
-    else:
-        log.warning("No results for oai_gnb_mac_nprb")
-
-    l1_result = query_prometheus({"query": "oai_gnb_l1_total_prbs"}, MONARCH_THANOS_URL)
-    if not l1_result:
-        log.warning("No results for oai_gnb_l1_total_prbs")
-        return
+    remote_plan = {name: params for name, params in plan.items() if name not in LOCAL_QUERIES}
+    if not remote_plan:
+        return results, len(SCRAPE_TARGETS)
+    if not MONARCH_THANOS_URL:
+        log.warning(f"No local evaluator for {list(remote_plan)} and MONARCH_THANOS_URL is not set")
+        results.update({name: [] for name in remote_plan})
+        return results, len(SCRAPE_TARGETS)
 
-    try:
-        total_prbs = float(l1_result[0]["value"][1])
-        log.debug(f"Total PRBs from L1: {total_prbs}")
-    except (IndexError, KeyError, ValueError) as e:
-        log.warning(f"Error parsing total PRBs: {e}")
-        return
+    remote_results, http_queries = execute_query_plan(remote_plan)
+    results.update(remote_results)
+    return results, len(SCRAPE_TARGETS) + http_queries
 
-    if total_prbs == 0:
-        log.warning("Total PRBs is zero, cannot divide!")
-        return
+def execute_query_plan(plan):
+    """
+    Run every query of the plan against Thanos in parallel, so that the cycle
+    latency is the slowest query instead of the sum of all queries.
+    Returns a dictionary of the form {query_name: results} and the number of HTTP queries issued.
+    """
+    futures = {
+        name: QUERY_EXECUTOR.submit(query_prometheus, params, MONARCH_THANOS_URL)
+        for name, params in plan.items()
+    }
+    results = {name: future.result() or [] for name, future in futures.items()}
+    http_queries = len(plan)
+
+    # fall back to the raw queries for recording rules without data (e.g. the rules are not installed),
+    # and keep using the raw queries for RECORDING_RULES_RETRY seconds before trying the rules again
+    fallback = {
+        name: QUERIES[name]
+        for name, params in plan.items()
+        if not results[name] and params["query"] == RECORDED_QUERIES.get(name)
+    }
+    if fallback:
+        log.warning(f"No data for recording rules {list(fallback)}, falling back to raw queries")
+        now = time.monotonic()
+        for name in fallback:
+            MISSING_RECORDING_RULES[name] = now
+        fallback_results, fallback_queries = execute_query_plan(fallback)
+        results.update(fallback_results)
+        http_queries += fallback_queries
+    return results, http_queries
+
+def generate_recording_rules():
+    """
+    Generate a PrometheusRule manifest pre-computing the queries of the KPIs flagged with "recording_rules".
+    The manifest is written for envsubst, like the other manifests of this component.
+    """
+    lines = [
+        "# Generated by: python kpi_calculator.py --generate-rules",
+        "apiVersion: monitoring.coreos.com/v1",
+        "kind: PrometheusRule",
+        "metadata:",
+        "  name: kpi-calculator-rules",
+        "  namespace: monarch",
+        "  labels:",
+        "    app: monarch",
+        "    component: kpi-calculator",
+        "    release: nssdc # picked up by the NSSDC Prometheus",
+        "spec:",
+        "  groups:",
+        "    - name: kpi-calculator",
+        f'      interval: "{RECORDING_RULES_GROUP_INTERVAL}"',
+        "      rules:",
+    ]
+    for name, record in RECORDED_QUERIES.items():
+        lines.append(f"        - record: {record}")
+        lines.append(f"          expr: {json.dumps(QUERIES[name]['query'])}")
+    return "\n".join(lines) + "\n"
+
+def get_slice_throughput(results):
+    """
+    Demultiplexes the per-direction slice throughput queries.
+    Returns a dictionary of the form {(snssai, seid, direction): value (bits/sec)}
+    """
+    throughput = {}
+    for direction in ("uplink", "downlink"):
+        for result in results[f"slice_throughput_{direction}"]:
+            snssai = result["metric"].get("snssai")
+            seid = result["metric"].get("seid")
+            throughput[(snssai, seid, direction)] = float(result["value"][1])
+    return throughput
+
+def get_mac_throughput_per_rnti_and_direction(results):
+    """
+    Returns throughput per UE RNTI for both directions, computed locally by MAC_RATE_ENGINE
+    from the scrape samples of the raw oai_gnb_mac_tx_bytes / oai_gnb_mac_rx_bytes counters.
+    The range selector gives the real scrape timestamps (an instant query only gives its evaluation time),
+    and its last two samples give a rate as soon as an RNTI appears.
+    Returns a dictionary of the form {(rnti, direction): value (bits/sec)}
+    """
+    metric_directions = {metric: direction for direction, metric in MAC_DIRECTION_METRICS.items()}
+    samples = (
+        (
+            (result["metric"]["__name__"], result["metric"].get("rnti")),
+            [(float(timestamp), float(value)) for timestamp, value in result["values"]],
+        )
+        for result in results["mac_counters"]
+        if result["metric"]["__name__"] in metric_directions
+    )
 
-    saturation_percentage = (total_nprb / total_prbs) * 100
-    log.info(f"Computed Saturation = {saturation_percentage:.2f}% (Active NPRBs={total_nprb}, Total PRBs={total_prbs})")
-    return saturation_percentage
+    throughput = {}
+    for (metric, rnti), bytes_per_sec in MAC_RATE_ENGINE.update(samples).items():
+        throughput[(rnti, metric_directions[metric])] = bytes_per_sec * 8
+    return throughput
 
-def get_saturation_percentage_per_rnti():
+def get_active_rntis(results):
     """
-    Compute gNB PRB saturation only for UEs with active traffic:
-    (sum of mac_nprb for active UEs) / (total PRBs from L1 stats) * 100
-    Returns a dictionary of the form {rnti: value (percentage)}
+    Return the set of RNTIs with a non-zero MAC tx rate.
     """
     active_rntis = set()
-    tx_bytes_query = f'rate(oai_gnb_mac_tx_bytes[{TIME_RANGE}])'
-    tx_results = query_prometheus({"query": tx_bytes_query}, MONARCH_THANOS_URL)
+    for result in results["mac_tx_rate"]:
+        rnti = result["metric"].get("rnti")
+        value = float(result["value"][1])
+        log.debug(f"RNTI: {rnti}, rate: {value}")
+        if rnti and value > 0:
+            active_rntis.add(rnti)
 
-    
-    if tx_results:
-        for result in tx_results:
-            rnti = result["metric"].get("rnti")
-            value = float(result["value"][1])
-            if rnti and value > 0:
-                active_rntis.add(rnti)
-    else:
+    if not active_rntis:
         log.warning("No active RNTIs found from tx_bytes rate")
+    log.debug(f"Found {len(active_rntis)} active RNTIs (non-zero tx rate)")
+    return active_rntis
 
-    log.info(f"Found {len(active_rntis)} active RNTIs (non-zero tx rate) for number_ues")
+def get_number_ues(results):
+    """
+    Returns a dictionary of the form {(): number of active RNTIs}
+    """
+    return {(): len(get_active_rntis(results))}
 
-    l1_result = query_prometheus({"query": "oai_gnb_l1_total_prbs"}, MONARCH_THANOS_URL)
-    if not l1_result:
+def get_saturation_percentage_per_rnti(results):
+    """
+    Compute gNB PRB saturation only for UEs with active traffic:
+    (mac_nprb of each active UE) / (total PRBs from L1 stats) * 100
+    Returns a dictionary of the form {(rnti,): value (percentage)}
+    """
+    active_rntis = get_active_rntis(results)
+    nprb_results = []
+    l1_results = []
+    for result in results["gnb_counters"]:
+        metric = result["metric"]["__name__"]
+        if metric == "oai_gnb_mac_nprb":
+            nprb_results.append(result)
+        elif metric == "oai_gnb_l1_total_prbs":
+            l1_results.append(result)
+
+    if not l1_results:
         log.warning("No results for oai_gnb_l1_total_prbs")
-        return
+        return {}
 
     try:
-        total_prbs = float(l1_result[0]["value"][1])
+        total_prbs = float(l1_results[0]["value"][1])
         log.debug(f"Total PRBs from L1: {total_prbs}")
     except (IndexError, KeyError, ValueError) as e:
         log.warning(f"Error parsing total PRBs: {e}")
-        return
+        return {}
 
     if total_prbs == 0:
         log.warning("Total PRBs is zero, cannot divide!")
-        return
-
-    mac_nprb_query = "oai_gnb_mac_nprb"
-    nprb_results = query_prometheus({"query": mac_nprb_query}, MONARCH_THANOS_URL)
-
-    nprbs = {}
-    if nprb_results:
-        for result in nprb_results:
-            try:
-                rnti = result["metric"]["rnti"]
-                if rnti in active_rntis:
-                    val = float(result["value"][1])
-                    nprbs[rnti] = val
-                    log.debug(f"NPRB for active RNTI {rnti}: {val}")
-                else:
-                    val = float(0)
-                    nprbs[rnti] = val
-                    log.debug(f"0 NPRB For Disconnected RNTI {rnti}")
-            except (KeyError, ValueError) as e:
-                log.warning(f"Failed to parse NPRB result: {e}")
-    else:
+        return {}
+
+    if not nprb_results:
         log.warning("No results for oai_gnb_mac_nprb")
 
     saturation_percentage_per_rnti = {}
-    for rnti, nprb in nprbs.items():
-        saturation_percentage_per_rnti[rnti] = (nprb / total_prbs) * 100
-        log.info(f"Computed Saturation = {saturation_percentage_per_rnti[rnti]:.2f}%")
+    for result in nprb_results:
+        try:
+            rnti = result["metric"]["rnti"]
+            if rnti in active_rntis:
+                nprb = float(result["value"][1])
+                log.debug(f"NPRB for active RNTI {rnti}: {nprb}")
+            else:
+                nprb = float(0)
+                log.debug(f"0 NPRB For Disconnected RNTI {rnti}")
+        except (KeyError, ValueError) as e:
+            log.warning(f"Failed to parse NPRB result: {e}")
+            continue
+        saturation_percentage_per_rnti[(rnti,)] = (nprb / total_prbs) * 100
 
     return saturation_percentage_per_rnti
 
-def get_active_snssais():
+
+# Compute functions referenced by the "compute" field of the KPI registry
+COMPUTE_FUNCTIONS = {
+    "slice_throughput": get_slice_throughput,
+    "mac_throughput": get_mac_throughput_per_rnti_and_direction,
+    "number_ues": get_number_ues,
+    "saturation_percentage": get_saturation_percentage_per_rnti,
+}
+
+
+def load_kpi_registry(file_path):
     """
-    Return a list of active SNSSAIs from the SMF.
+    Load the declarative KPI registry and compile it into a dispatch table.
+    PromQL templates are rendered once, and a snapshot collector is registered per KPI.
+    Returns a dictionary of the form {kpi_name: {"queries", "recorded_queries", "compute", "collector", "period"}}
     """
-    time_range = TIME_RANGE
-    query = f'sum by (snssai) (rate(fivegs_smffunction_sm_seid_session[{time_range}]))'
-    log.debug(query)
-    params = {'query': query}
-    results = query_prometheus(params, MONARCH_THANOS_URL)
-    active_snssais = [result["metric"]["snssai"] for result in results]
-    return active_snssais
+    with open(file_path, "r") as file:
+        registry = json.load(file)
+
+    kpis = {}
+    query_templates = {}
+    for kpi in registry:
+        kpi_name = kpi["kpi_name"]
+        if kpi["compute"] not in COMPUTE_FUNCTIONS:
+            raise ValueError(f"Unknown compute function for KPI {kpi_name}: {kpi['compute']}")
+
+        queries = {}
+        recorded_queries = {}
+        for name, template in kpi["queries"].items():
+            # queries are shared between KPIs by name, so the same name must mean the same query
+            if query_templates.setdefault(name, template) != template:
+                raise ValueError(f"Query {name} of KPI {kpi_name} conflicts with another KPI")
+            queries[name] = {"query": Template(template).substitute(time_range=TIME_RANGE)}
+            if kpi.get("recording_rules"):
+                recorded_queries[name] = f"monarch:{name}"
+
+        collector = KPISnapshotCollector(kpi["kpi_prom_metric_name"], kpi["kpi_description"], kpi["labels"])
+        prom.REGISTRY.register(collector)
+        kpis[kpi_name] = {
+            "queries": queries,
+            "recorded_queries": recorded_queries,
+            "compute": COMPUTE_FUNCTIONS[kpi["compute"]],
+            "collector": collector,
+            "period": float(UPDATE_PERIOD if UPDATE_PERIOD_OVERRIDE else kpi.get("default_period", UPDATE_PERIOD)),
+        }
+    return kpis
+
+
+KPIS = load_kpi_registry(KPI_REGISTRY_PATH)
+QUERIES = {name: params for kpi in KPIS.values() for name, params in kpi["queries"].items()}
+RECORDED_QUERIES = {name: record for kpi in KPIS.values() for name, record in kpi["recorded_queries"].items()}
+MISSING_RECORDING_RULES = {}  # {query_name: monotonic time of the last fallback}
 
 def main():
     log.info("Starting Prometheus server on port {}".format(EXPORTER_PORT))
 
-    if not MONARCH_THANOS_URL:
+    if KPI_SOURCE == "scrape":
+        if not SCRAPE_TARGETS:
+            log.error("SCRAPE_TARGETS is not set")
+            return
+        log.info(f"Scrape targets: {SCRAPE_TARGETS}")
+    elif not MONARCH_THANOS_URL:
         log.error("MONARCH_THANOS_URL is not set")
         return 
 
     log.info(f"Monarch Thanos URL: {MONARCH_THANOS_URL}")
     log.info(f"Time range: {TIME_RANGE}")
+    kpi_periods = get_kpi_periods()
     log.info(f"Update period: {UPDATE_PERIOD}")
+    log.info(f"KPI periods: {kpi_periods}")
+    log.info(f"Query concurrency: {QUERY_CONCURRENCY}, timeout: {QUERY_TIMEOUT}s")
+    log.info(f"Recording rules: {RECORDING_RULES}")
     prom.start_http_server(EXPORTER_PORT)
 
+    scheduler = DeadlineScheduler(kpi_periods)
     while True:
+        kpi_names, lag, skipped_ticks = scheduler.wait_for_next_cycle()
+        KPI_CYCLE_LAG.set(lag)
+        if skipped_ticks:
+            log.warning(f"Skipped {skipped_ticks} missed KPI deadlines")
+            KPI_CYCLE_SKIPPED_TICKS.inc(skipped_ticks)
+
+        start_time = time.monotonic()
         try:
-            run_kpi_computation()
+            run_kpi_computation(kpi_names)
         except Exception as e:
             log.error(f"Failing to run KPI computation: {e}")
-        time.sleep(UPDATE_PERIOD)
-
-def export_to_prometheus(snssai, seid, direction, value):
-    value_mbits = round(value / 10 ** 6, 6)
-    log.info(f"SNSSAI={snssai} | SEID={seid} | DIR={direction:8s} | RATE (Mbps)={value_mbits}")
-    SLICE_THROUGHPUT.labels(snssai=snssai, seid=seid, direction=direction).set(value)
-
-def export_mac_throughput_to_prometheus(rnti, direction, value):
-    value_mbits = round(value / 10 ** 6, 6)
-    log.info(f"RNTI={rnti} | DIR={direction} | RATE (Mbps)={value_mbits}")
-    MAC_THROUGHPUT.labels(rnti=rnti, direction=direction).set(value)
-
-def export_number_ues_to_prometheus(value):
-    log.info(f"VALUE ={value}")
-    NUMBER_UES.set(value)
-
-# def export_saturation_percentage_to_prometheus(value):
-#     log.info(f"VALUE ={value}")
-#     SATURATION_PERCENTAGE.set(value)
-
-def export_saturation_percentage_to_prometheus(rnti, value):
-    log.info(f"RNTI={rnti} | VALUE ={value}")
-    SATURATION_PERCENTAGE.labels(rnti=rnti).set(value)
-
-def run_kpi_computation():
-    directions = ["uplink", "downlink"]
-    active_snssais = get_active_snssais()
-    if not active_snssais:
-        log.warning("No active SNSSAIs found")
-        return
-    
-    log.debug(f"Active SNSSAIs: {active_snssais}")
-    for snssai in active_snssais:
-        for direction in directions:
-            throughput_per_seid = get_slice_throughput_per_seid_and_direction(snssai, direction)
-            for seid, value in throughput_per_seid.items():
-                export_to_prometheus(snssai, seid, direction, value)
-
-    for direction in directions:
-        mac_throughput = get_mac_throughput_per_rnti_and_direction(direction)
-        for rnti, value in mac_throughput.items():
-            export_mac_throughput_to_prometheus(rnti, direction, value)
-    
-    number_ues = get_number_ues()
-    export_number_ues_to_prometheus(number_ues)
-
-    # saturation_percentage = get_saturation_percentage()
-    # export_saturation_percentage_to_prometheus(saturation_percentage)
+        duration = time.monotonic() - start_time
+
+        KPI_CYCLE_DURATION.set(duration)
+        if duration > min(kpi_periods[kpi_name] for kpi_name in kpi_names):
+            log.warning(f"KPI cycle overran its period: {duration:.3f}s for {kpi_names}")
+            KPI_CYCLE_OVERRUNS.inc()
+
+def export_to_prometheus(kpi_name, values):
+    if log.isEnabledFor(logging.DEBUG):
+        for labelvalues, value in values.items():
+            log.debug(f"KPI={kpi_name} | LABELS={labelvalues} | VALUE={value}")
+    collector = KPIS[kpi_name]["collector"]
+    collector.update(values)
+    collector.end_cycle()
+
+def run_kpi_computation(kpi_names=KPIS):
+    plan = build_query_plan(kpi_names)
+    if KPI_SOURCE == "scrape":
+        results, http_queries = execute_local_query_plan(plan)
+    else:
+        results, http_queries = execute_query_plan(plan)
+    log.info(f"KPI cycle issued {http_queries} HTTP queries")
+    KPI_CYCLE_QUERIES.set(http_queries)
 
-    saturation_percentage = get_saturation_percentage_per_rnti()
-    for rnti, value in saturation_percentage.items():
-        export_saturation_percentage_to_prometheus(rnti, value)
+    for kpi_name in kpi_names:
+        values = KPIS[kpi_name]["compute"](results)
+        if not values:
+            log.warning(f"No values computed for {kpi_name}")
+        export_to_prometheus(kpi_name, values)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='KPI calculator.')
     parser.add_argument('--log', default='info', help='Log verbosity level. Default is "info". Options are "debug", "info", "warning", "error", "critical".')
+    parser.add_argument('--generate-rules', action='store_true', help='Print the PrometheusRule manifest for the recording rules and exit.')
 
     args = parser.parse_args()
 
+    if args.generate_rules:
+        print(generate_recording_rules(), end="")
+        raise SystemExit(0)
+
     # Convert log level from string to logging level
     log_level = getattr(logging, args.log.upper(), None)
     if not isinstance(log_level, int):
@@ -0,0 +1,144 @@
+"""
+In-memory ring-buffer TSDB used by the KPI calculator to evaluate KPIs from
+metrics scraped directly from the MDEs, without a round-trip to Thanos.
+"""
+import numpy as np
+from prometheus_client.parser import text_string_to_metric_families
+
+
+def scrape(session, url, timeout):
+    """
+    Scrape a Prometheus text exposition endpoint.
+    Returns a list of (name, labels, value) tuples.
+    """
+    response = session.get(url, timeout=timeout)
+    response.raise_for_status()
+    samples = []
+    for family in text_string_to_metric_families(response.text):
+        for sample in family.samples:
+            samples.append((sample.name, sample.labels, sample.value))
+    return samples
+
+
+class RingBufferTSDB:
+    """
+    Fixed-size ring buffer of the last `capacity` samples of every series.
+    Samples are stored in preallocated (series x capacity) NumPy arrays, one row per series,
+    so that range functions like rate() are evaluated over all series of a metric at once.
+    """
+
+    def __init__(self, capacity=64, initial_series=1024):
+        self.capacity = capacity
+        self.series = {}  # {(name, sorted label items): row}
+        self.series_by_name = {}  # {name: {row: labels}}
+        self.free_rows = []
+        self.timestamps = np.full((initial_series, capacity), np.nan)
+        self.values = np.zeros((initial_series, capacity))
+        self.positions = np.zeros(initial_series, dtype=np.int64)  # next write position of each row
+        self.next_row = 0
+
+    def _allocate_row(self):
+        if self.free_rows:
+            return self.free_rows.pop()
+        if self.next_row == self.timestamps.shape[0]:
+            # grow geometrically so that appends stay amortized O(1)
+            rows = self.timestamps.shape[0]
+            self.timestamps = np.vstack([self.timestamps, np.full((rows, self.capacity), np.nan)])
+            self.values = np.vstack([self.values, np.zeros((rows, self.capacity))])
+            self.positions = np.concatenate([self.positions, np.zeros(rows, dtype=np.int64)])
+        row = self.next_row
+        self.next_row += 1
+        return row
+
+    def ingest(self, samples, timestamp):
+        """
+        Append one scrape to the buffer.
+        samples: iterable of (name, labels, value) tuples, all taken at `timestamp`.
+        """
+        rows = []
+        values = []
+        for name, labels, value in samples:
+            key = (name, tuple(sorted(labels.items())))
+            row = self.series.get(key)
+            if row is None:
+                row = self._allocate_row()
+                self.series[key] = row
+                self.series_by_name.setdefault(name, {})[row] = labels
+            rows.append(row)
+            values.append(value)
+
+        if not rows:
+            return
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = self.positions[rows] % self.capacity
+        self.timestamps[rows, columns] = timestamp
+        self.values[rows, columns] = values
+        self.positions[rows] += 1
+
+    def evict(self, max_age, now):
+        """
+        Free the rows of series without samples in the last `max_age` seconds.
+        Returns the number of evicted series.
+        """
+        evicted = 0
+        for key, row in list(self.series.items()):
+            if not np.nanmax(self.timestamps[row]) >= now - max_age:
+                del self.series[key]
+                del self.series_by_name[key[0]][row]
+                self.timestamps[row] = np.nan
+                self.positions[row] = 0
+                self.free_rows.append(row)
+                evicted += 1
+        return evicted
+
+    def _ordered(self, name):
+        """
+        Returns the labels of every series of the metric and their samples, oldest first.
+        """
+        series = self.series_by_name.get(name)
+        if not series and not name.endswith("_total"):
+            # counters may be exposed with the OpenMetrics _total suffix
+            series = self.series_by_name.get(name + "_total")
+        if not series:
+            return [], np.empty((0, self.capacity)), np.empty((0, self.capacity))
+
+        rows = np.fromiter(series.keys(), dtype=np.int64, count=len(series))
+        order = (self.positions[rows, None] + np.arange(self.capacity)) % self.capacity
+        timestamps = np.take_along_axis(self.timestamps[rows], order, axis=1)
+        values = np.take_along_axis(self.values[rows], order, axis=1)
+        return list(series.values()), timestamps, values
+
+    def latest(self, name, max_age, now):
+        """
+        Instant selector: the last sample of every series of the metric not older than `max_age`.
+        Returns a list of (labels, timestamp, value) tuples.
+        """
+        labels, timestamps, values = self._ordered(name)
+        fresh = timestamps[:, -1] >= now - max_age
+        return [
+            (labels[i], timestamps[i, -1], values[i, -1])
+            for i in np.flatnonzero(fresh)
+        ]
+
+    def rate(self, name, window, now):
+        """
+        Per-second increase of every counter of the metric over the last `window` seconds,
+        accounting for counter resets. Unlike Prometheus, the rate is not extrapolated to the window edges.
+        Returns a list of (labels, value) tuples, for series with at least two samples in the window.
+        """
+        labels, timestamps, values = self._ordered(name)
+        in_window = timestamps >= now - window  # NaN (empty slots) compare False
+
+        deltas = values[:, 1:] - values[:, :-1]
+        # on a counter reset, the counter restarted from zero before the new sample
+        increases = np.where(deltas >= 0, deltas, values[:, 1:])
+        pairs = in_window[:, 1:] & in_window[:, :-1]
+        increase = np.where(pairs, increases, 0).sum(axis=1)
+
+        window_timestamps = np.where(in_window, timestamps, np.nan)
+        valid = in_window.sum(axis=1) >= 2
+        elapsed = np.zeros(len(labels))
+        elapsed[valid] = np.nanmax(window_timestamps[valid], axis=1) - np.nanmin(window_timestamps[valid], axis=1)
+        valid &= elapsed > 0
+
+        return [(labels[i], increase[i] / elapsed[i]) for i in np.flatnonzero(valid)]
@@ -1,3 +1,4 @@
+import json
 from app.logger import setup_logger
 from app.orchestrator import NFVOrchestratorManager
 import requests
@@ -9,36 +10,37 @@ class DirectiveManager:
         self.logger = setup_logger("directive_manager")
         self.nfv_orchestrator = nfv_orchestrator
 
+        # MDE install/uninstall actions for the "mde" field of the KPI registry
+        self.mde_actions = {
+            "mde": ("MDE", self.nfv_orchestrator.mde_install, self.nfv_orchestrator.mde_uninstall),
+            "gnb_mde": ("gNB MDE", self.nfv_orchestrator.gnb_mde_install, self.nfv_orchestrator.gnb_mde_uninstall),
+        }
+        self.load_supported_kpis("app/supported_kpis.json")
+
+    def load_supported_kpis(self, file_path):
+        self.logger.info(f"Loading supported KPIs from {file_path}")
+        with open(file_path, "r") as file:
+            supported_kpis = json.load(file)
+        # dispatch table: {kpi_name: (mde_label, mde_install, mde_uninstall)}
+        self.kpi_actions = {kpi["kpi_name"]: self.mde_actions[kpi["mde"]] for kpi in supported_kpis}
+
     def process_directive(self, directive):
         self.logger.info("Processing directive: %s", directive)
         kpi_name = directive["kpi_name"]
-        if kpi_name == "slice_throughput":
-            return self.process_slice_throughput_directive(directive)
-        
-        elif kpi_name == "mac_throughput":
-            return self.process_mac_throughput_directive(directive)
-        
-        elif kpi_name == "number_ues":
-            return self.process_number_ues_directive(directive)
-        
-        elif kpi_name == "saturation_percentage":
-            return self.process_saturation_percentage_directive(directive)
-
-        else:
+        if kpi_name not in self.kpi_actions:
             self.logger.error(f"KPI {kpi_name} not supported")
             raise NotImplementedError(f"KPI {kpi_name} not supported")
 
-    def process_slice_throughput_directive(self, directive):
-        self.logger.info("Processing slice throughput directive: %s", directive)
+        mde_label, mde_install, mde_uninstall = self.kpi_actions[kpi_name]
 
         if directive["action"] == "create":
             # for now, we will just install pre-configured MDE and KPI Computation
             # if NFV orchestrator supports it, we can change the configuration MDE and KPI computation components
             # using the information in the directive
-            self.logger.info("Installing MDE")
-            response_mde = self.nfv_orchestrator.mde_install()
+            self.logger.info("Installing %s", mde_label)
+            response_mde = mde_install()
             if response_mde.status_code != 200:
-                self.logger.error("Error installing MDE: %s", response_mde.text)
+                self.logger.error("Error installing %s: %s", mde_label, response_mde.text)
                 return response_mde
 
             self.logger.info("Installing KPI Computation")
@@ -47,14 +49,14 @@ class DirectiveManager:
                 self.logger.error("Error installing KPI Computation: %s", response_kpi.text)
                 return response_kpi
 
-            self.logger.info("Both MDE and KPI Computation installed successfully.")
+            self.logger.info("Both %s and KPI Computation installed successfully.", mde_label)
             return self._create_success_response(action="installed")
 
         elif directive["action"] == "delete":
-            self.logger.info("Uninstalling MDE")
-            response_mde = self.nfv_orchestrator.mde_uninstall()
+            self.logger.info("Uninstalling %s", mde_label)
+            response_mde = mde_uninstall()
             if response_mde.status_code != 200:
-                self.logger.error("Error uninstalling MDE: %s", response_mde.text)
+                self.logger.error("Error uninstalling %s: %s", mde_label, response_mde.text)
                 return response_mde
 
             self.logger.info("Uninstalling KPI Computation")
@@ -63,123 +65,8 @@ class DirectiveManager:
                 self.logger.error("Error uninstalling KPI Computation: %s", response_kpi.text)
                 return response_kpi
 
-            self.logger.info("Both MDE and KPI Computation uninstalled successfully.")
+            self.logger.info("Both %s and KPI Computation uninstalled successfully.", mde_label)
             return self._create_success_response(action="deleted")
-        
-    def process_mac_throughput_directive(self, directive):
-        self.logger.info("Processing MAC throughput directive: %s", directive)
-
-        if directive["action"] == "create":
-            # for now, we will just install pre-configured MDE and KPI Computation
-            # if NFV orchestrator supports it, we can change the configuration MDE and KPI computation components
-            # using the information in the directive
-            self.logger.info("Installing gNB MDE")
-            response_mde = self.nfv_orchestrator.gnb_mde_install()
-            if response_mde.status_code != 200:
-                self.logger.error("Error installing gNB MDE: %s", response_mde.text)
-                return response_mde
-
-            self.logger.info("Installing KPI Computation")
-            response_kpi = self.nfv_orchestrator.kpi_computation_install()
-            if response_kpi.status_code != 200:
-                self.logger.error("Error installing KPI Computation: %s", response_kpi.text)
-                return response_kpi
-
-            self.logger.info("Both gNB MDE and KPI Computation installed successfully.")
-            return self._create_success_response(action="installed")
-
-        elif directive["action"] == "delete":
-            self.logger.info("Uninstalling gNB MDE")
-            response_mde = self.nfv_orchestrator.gnb_mde_uninstall()
-            if response_mde.status_code != 200:
-                self.logger.error("Error uninstalling gNB MDE: %s", response_mde.text)
-                return response_mde
-
-            self.logger.info("Uninstalling KPI Computation")
-            response_kpi = self.nfv_orchestrator.kpi_computation_uninstall()
-            if response_kpi.status_code != 200:
-                self.logger.error("Error uninstalling KPI Computation: %s", response_kpi.text)
-                return response_kpi
-
-            self.logger.info("Both gNB MDE and KPI Computation uninstalled successfully.")
-            return self._create_success_response(action="deleted")
-        
-    def process_number_ues_directive(self, directive):
-        self.logger.info("Processing Number of connected UEs directive: %s", directive)
-
-        if directive["action"] == "create":
-            # for now, we will just install pre-configured MDE and KPI Computation
-            # if NFV orchestrator supports it, we can change the configuration MDE and KPI computation components
-            # using the information in the directive
-            self.logger.info("Installing gNB MDE")
-            response_mde = self.nfv_orchestrator.gnb_mde_install()
-            if response_mde.status_code != 200:
-                self.logger.error("Error installing gNB MDE: %s", response_mde.text)
-                return response_mde
-
-            self.logger.info("Installing KPI Computation")
-            response_kpi = self.nfv_orchestrator.kpi_computation_install()
-            if response_kpi.status_code != 200:
-                self.logger.error("Error installing KPI Computation: %s", response_kpi.text)
-                return response_kpi
-
-            self.logger.info("Both gNB MDE and KPI Computation installed successfully.")
-            return self._create_success_response(action="installed")
-
-        elif directive["action"] == "delete":
-            self.logger.info("Uninstalling gNB MDE")
-            response_mde = self.nfv_orchestrator.gnb_mde_uninstall()
-            if response_mde.status_code != 200:
-                self.logger.error("Error uninstalling gNB MDE: %s", response_mde.text)
-                return response_mde
-
-            self.logger.info("Uninstalling KPI Computation")
-            response_kpi = self.nfv_orchestrator.kpi_computation_uninstall()
-            if response_kpi.status_code != 200:
-                self.logger.error("Error uninstalling KPI Computation: %s", response_kpi.text)
-                return response_kpi
-
-            self.logger.info("Both gNB MDE and KPI Computation uninstalled successfully.")
-            return self._create_success_response(action="deleted")
-        
-    def process_saturation_percentage_directive(self, directive):
-        self.logger.info("Processing PRB saturation percentage directive: %s", directive)
-
-        if directive["action"] == "create":
-            # for now, we will just install pre-configured MDE and KPI Computation
-            # if NFV orchestrator supports it, we can change the configuration MDE and KPI computation components
-            # using the information in the directive
-            self.logger.info("Installing gNB MDE")
-            response_mde = self.nfv_orchestrator.gnb_mde_install()
-            if response_mde.status_code != 200:
-                self.logger.error("Error installing gNB MDE: %s", response_mde.text)
-                return response_mde
-
-            self.logger.info("Installing KPI Computation")
-            response_kpi = self.nfv_orchestrator.kpi_computation_install()
-            if response_kpi.status_code != 200:
-                self.logger.error("Error installing KPI Computation: %s", response_kpi.text)
-                return response_kpi
-
-            self.logger.info("Both gNB MDE and KPI Computation installed successfully.")
-            return self._create_success_response(action="installed")
-
-        elif directive["action"] == "delete":
-            self.logger.info("Uninstalling gNB MDE")
-            response_mde = self.nfv_orchestrator.gnb_mde_uninstall()
-            if response_mde.status_code != 200:
-                self.logger.error("Error uninstalling gNB MDE: %s", response_mde.text)
-                return response_mde
-
-            self.logger.info("Uninstalling KPI Computation")
-            response_kpi = self.nfv_orchestrator.kpi_computation_uninstall()
-            if response_kpi.status_code != 200:
-                self.logger.error("Error uninstalling KPI Computation: %s", response_kpi.text)
-                return response_kpi
-
-            self.logger.info("Both gNB MDE and KPI Computation uninstalled successfully.")
-            return self._create_success_response(action="deleted")
-
 
     def _create_success_response(self, action="installed"):
         response = Response()
@@ -46,18 +46,44 @@ class MonitoringManager:
         response = self.directive_manager.process_directive(data)
         return jsonify({"status": "success", "message": response.text}), response.status_code
 
+    @staticmethod
+    def _request_ids(directive):
+        """
+        Request IDs covered by a directive: a single request_id, or request_ids for a combined directive.
+        """
+        if "request_ids" in directive:
+            return list(directive["request_ids"])
+        return [directive["request_id"]]
+
     def health_check(self):
         return jsonify({"status": "success", "message": "Monitoring Manager is healthy"}), 200
 
     def delete_directive(self):
         data = request.get_json()
         self.logger.info("Received delete directive: %s", data)
+        request_ids = set(self._request_ids(data))
+        found = False
+        remaining_directives = []
         for directive in self.directives:
-            if directive["request_id"] == data["request_id"]:
-                self.directives.remove(directive)
-                response = self.directive_manager.process_directive(data)
-                return jsonify({"status": "success", "message": response.text}), response.status_code
-        return jsonify({"status": "error", "message": "Directive not found"}), 404
+            directive_request_ids = self._request_ids(directive)
+            if request_ids.isdisjoint(directive_request_ids):
+                remaining_directives.append(directive)
+                continue
+            found = True
+            # a combined directive stays until all of its requests are deleted
+            directive_request_ids = [request_id for request_id in directive_request_ids if request_id not in request_ids]
+            if directive_request_ids:
+                remaining_directives.append(dict(directive, request_ids=directive_request_ids))
+        if not found:
+            return jsonify({"status": "error", "message": "Directive not found"}), 404
+
+        self.directives = remaining_directives
+        # the MDE and KPI computation of the KPI are only uninstalled once no request needs them anymore
+        if any(directive["kpi_name"] == data["kpi_name"] for directive in self.directives):
+            self.logger.info("Components of %s still used by other requests, not uninstalling them", data["kpi_name"])
+            return jsonify({"status": "success", "message": "Directive deleted, components still in use"}), 200
+        response = self.directive_manager.process_directive(data)
+        return jsonify({"status": "success", "message": response.text}), response.status_code
 
     def list_directives(self):
         return jsonify(self.directives), 200
@@ -0,0 +1,113 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+import queue
+import threading
+import shortuuid
+from app.logger import setup_logger
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class Job:
+    """
+    State of a background task: queued -> running -> succeeded | failed.
+    progress goes from 0 to 1, message describes the current step.
+    """
+
+    def __init__(self, job_id, task, info):
+        self.job_id = job_id
+        self.task = task
+        self.info = info
+        self.state = "queued"
+        self.progress = 0.0
+        self.message = "Queued"
+        self.error = None
+        self.result = None
+        self.created_at = datetime.now(timezone.utc)
+        self.updated_at = self.created_at
+        self.lock = threading.Lock()
+
+    def update(self, state=None, progress=None, message=None, error=None, result=None):
+        with self.lock:
+            if state is not None:
+                self.state = state
+            if progress is not None:
+                self.progress = progress
+            if message is not None:
+                self.message = message
+            if error is not None:
+                self.error = error
+            if result is not None:
+                self.result = result
+            self.updated_at = datetime.now(timezone.utc)
+
+    def to_dict(self):
+        with self.lock:
+            return dict(
+                self.info,
+                job_id=self.job_id,
+                state=self.state,
+                progress=self.progress,
+                message=self.message,
+                error=self.error,
+                result=self.result,
+                created_at=self.created_at.isoformat(),
+                updated_at=self.updated_at.isoformat(),
+            )
+
+
+class JobManager:
+    """
+    Runs tasks on a fixed pool of worker threads fed by a bounded queue.
+    A task is a callable taking its Job, to report progress with job.update().
+    The most recent max_jobs jobs are kept for status queries.
+    """
+
+    def __init__(self, workers=4, queue_size=1000, max_jobs=10000):
+        self.logger = setup_logger("job_manager")
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()  # {job_id: Job}, oldest first
+        self.lock = threading.Lock()
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True).start()
+        self.logger.info(f"Started {workers} workers, queue size {queue_size}")
+
+    def submit(self, task, **info):
+        """
+        Queue a task and return its Job. Raises QueueFullError if the queue is full.
+        info is reported as is in the job status (e.g. request_id).
+        """
+        job = Job(shortuuid.uuid(), task, info)
+        # registered before it is queued, so that its status is available as soon as a worker runs it
+        with self.lock:
+            self.jobs[job.job_id] = job
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            with self.lock:
+                self.jobs.pop(job.job_id, None)
+            raise QueueFullError(f"Job queue is full ({self.queue.maxsize} jobs)")
+        with self.lock:
+            while len(self.jobs) > self.max_jobs:
+                self.jobs.popitem(last=False)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def _worker(self):
+        while True:
+            job = self.queue.get()
+            job.update(state="running", message="Running")
+            try:
+                job.task(job)
+                job.update(state="succeeded", progress=1.0, message="Done")
+            except Exception as e:
+                self.logger.error(f"Job {job.job_id} failed: {e}")
+                job.update(state="failed", message="Failed", error=str(e))
+            finally:
+                self.queue.task_done()
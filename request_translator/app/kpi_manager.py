@@ -11,6 +11,8 @@ class KPIManager:
         self.logger.info(f"Loading supported KPIs from {file_path}")
         with open(file_path, "r") as file:
             self.supported_kpis = json.load(file)
+        # KPI registry indexed by name, shared with the translation manager
+        self.kpis = {kpi["kpi_name"]: kpi for kpi in self.supported_kpis}
 
     def list_supported_kpis(self):
         return [
@@ -22,7 +24,10 @@ class KPIManager:
             for kpi in self.supported_kpis
         ]
 
+    def get_kpi(self, kpi_name):
+        return self.kpis.get(kpi_name)
+
     def is_kpi_supported(self, monitoring_request):
         kpi = monitoring_request.get("kpi")
         kpi_name = kpi.get("kpi_name")
-        return any(kpi["kpi_name"] == kpi_name for kpi in self.supported_kpis)
+        return kpi_name in self.kpis
@@ -0,0 +1,147 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+import threading
+from pymongo import ASCENDING, ReplaceOne
+from app.logger import setup_logger
+
+
+class RequestStore:
+    """
+    Write-through store of the monitoring requests, persisted in MongoDB.
+    A bounded LRU cache in front of the collection serves repeated lookups by request_id.
+    """
+
+    def __init__(self, database_manager, collection_name="monitoring_requests", cache_size=1024):
+        self.logger = setup_logger("request_store")
+        self.collection = database_manager.db[collection_name]
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # {request_id: document}, least recently used first
+        self.lock = threading.Lock()
+        self._create_indexes()
+
+    def _create_indexes(self):
+        self.collection.create_index([("request_id", ASCENDING)], unique=True)
+        for field in ["kpi_name", "scope_id", "status"]:
+            self.collection.create_index([(field, ASCENDING)])
+        self.logger.info(f"Using collection {self.collection.name} ({self.collection.estimated_document_count()} requests)")
+
+    def _cache_put(self, request_id, document):
+        with self.lock:
+            self.cache[request_id] = document
+            self.cache.move_to_end(request_id)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def _cache_get(self, request_id):
+        with self.lock:
+            document = self.cache.get(request_id)
+            if document is not None:
+                self.cache.move_to_end(request_id)
+            return document
+
+    def _cache_pop(self, request_id):
+        with self.lock:
+            self.cache.pop(request_id, None)
+
+    def _document(self, request_id, data, status):
+        return {
+            "request_id": request_id,
+            "kpi_name": data["kpi"]["kpi_name"],
+            "scope_type": data["scope"]["scope_type"],
+            "scope_id": data["scope"].get("scope_id"),
+            "status": status,
+            "created_at": datetime.now(timezone.utc),
+            "data": data,
+        }
+
+    def put(self, request_id, data, status="active"):
+        """Insert or replace a monitoring request."""
+        document = self._document(request_id, data, status)
+        self.collection.replace_one({"request_id": request_id}, document, upsert=True)
+        self._cache_put(request_id, document)
+        return document
+
+    def put_many(self, requests, status="active"):
+        """Insert or replace {request_id: data} monitoring requests in one round trip."""
+        documents = [self._document(request_id, data, status) for request_id, data in requests.items()]
+        if documents:
+            self.collection.bulk_write(
+                [ReplaceOne({"request_id": document["request_id"]}, document, upsert=True) for document in documents],
+                ordered=False,
+            )
+        for document in documents:
+            self._cache_put(document["request_id"], document)
+        return documents
+
+    def get(self, request_id):
+        """Returns the document of a monitoring request, or None."""
+        document = self._cache_get(request_id)
+        if document is None:
+            document = self.collection.find_one({"request_id": request_id}, {"_id": 0})
+            if document is not None:
+                self._cache_put(request_id, document)
+        return document
+
+    def update_status(self, request_id, status):
+        """Returns True if the request exists."""
+        result = self.collection.update_one({"request_id": request_id}, {"$set": {"status": status}})
+        if result.matched_count == 0:
+            self._cache_pop(request_id)
+            return False
+        document = self._cache_get(request_id)
+        if document is not None:
+            self._cache_put(request_id, dict(document, status=status))
+        return True
+
+    def get_many(self, request_ids):
+        """Returns {request_id: document} of the requests that exist."""
+        documents = {}
+        missing = []
+        for request_id in request_ids:
+            document = self._cache_get(request_id)
+            if document is None:
+                missing.append(request_id)
+            else:
+                documents[request_id] = document
+        if missing:
+            for document in self.collection.find({"request_id": {"$in": missing}}, {"_id": 0}):
+                documents[document["request_id"]] = document
+                self._cache_put(document["request_id"], document)
+        return documents
+
+    def update_status_many(self, request_ids, status):
+        self.collection.update_many({"request_id": {"$in": list(request_ids)}}, {"$set": {"status": status}})
+        for request_id in request_ids:
+            document = self._cache_get(request_id)
+            if document is not None:
+                self._cache_put(request_id, dict(document, status=status))
+
+    def delete_many(self, request_ids):
+        self.collection.delete_many({"request_id": {"$in": list(request_ids)}})
+        for request_id in request_ids:
+            self._cache_pop(request_id)
+
+    def delete(self, request_id):
+        """Returns True if the request existed."""
+        result = self.collection.delete_one({"request_id": request_id})
+        self._cache_pop(request_id)
+        return result.deleted_count > 0
+
+    def find(self, filters):
+        """Returns all the requests matching the filters, in insertion order."""
+        return list(self.collection.find(filters, {"_id": 0}).sort("_id", ASCENDING))
+
+    def list(self, filters=None, page=1, page_size=100):
+        """
+        Returns (documents, total) for one page of the requests matching the filters,
+        e.g. {"kpi_name": "slice_throughput", "status": "active"}, in insertion order.
+        """
+        query = {field: value for field, value in (filters or {}).items() if value is not None}
+        total = self.collection.count_documents(query)
+        cursor = (
+            self.collection.find(query, {"_id": 0})
+            .sort("_id", ASCENDING)
+            .skip((page - 1) * page_size)
+            .limit(page_size)
+        )
+        return list(cursor), total
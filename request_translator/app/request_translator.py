@@ -8,32 +8,44 @@ Request translator component of Monarch.
 """
 
 from flask import Flask, request, jsonify
-from jsonschema import validate, ValidationError
+from jsonschema import ValidationError
 import shortuuid
 import json
+import os
 import requests
 from app.kpi_manager import KPIManager
 from app.service_orchestrator import ServiceOrchestratorManager
 from app.db_manager import DatabaseManager
+from app.request_store import RequestStore
+from app.job_manager import JobManager, QueueFullError
+from app.request_validator import RequestValidator
 from app.comm_manager import CommunicationManager
 from app.translation_manager import TranslationManager
 from app.logger import setup_logger
 
 
 class RequestTranslator:
-    def __init__(self, monitoring_manager_uri, mongodb_uri, service_orchestrator_uri):
+    MAX_PAGE_SIZE = 1000
+    MAX_BULK_SIZE = 1000
+
+    def __init__(self, monitoring_manager_uri, mongodb_uri, service_orchestrator_uri, request_cache_size=1024,
+                 job_workers=4, job_queue_size=1000, service_orchestrator_cache_ttl=60,
+                 service_orchestrator_timeout=5):
         self.app = Flask(__name__)
         self.logger = setup_logger("request_translator")
         self.monitoring_manager_uri = monitoring_manager_uri
         self.service_orchestrator_uri = service_orchestrator_uri
         self.mongodb_uri = mongodb_uri
-        self.monitoring_requests = {}
 
         self.kpi_manager = KPIManager()
-        self.service_orchestrator = ServiceOrchestratorManager(service_orchestrator_uri)
+        self.service_orchestrator = ServiceOrchestratorManager(
+            service_orchestrator_uri, cache_ttl=service_orchestrator_cache_ttl, timeout=service_orchestrator_timeout
+        )
         self.database_manager = DatabaseManager(mongodb_uri)
+        self.request_store = RequestStore(self.database_manager, cache_size=request_cache_size)
         self.comm_manager = CommunicationManager(monitoring_manager_uri)
-        self.translation_manager = TranslationManager(self.service_orchestrator)
+        self.translation_manager = TranslationManager(self.service_orchestrator, self.kpi_manager)
+        self.job_manager = JobManager(workers=job_workers, queue_size=job_queue_size)
 
         self._load_configuration()
         self._set_routes()
@@ -41,6 +53,27 @@ class RequestTranslator:
     def _load_configuration(self):
         with open("app/schema.json", "r") as file:
             self.schema = json.load(file)
+        self.request_validator = RequestValidator(self.schema)
+
+    def _resume_pending_requests(self):
+        """
+        Requeue the requests left pending by a restart, since their jobs only lived in memory.
+        Requests that cannot be queued are removed, as if their submission had failed.
+        """
+        documents = self.request_store.find({"status": "pending"})
+        if not documents:
+            return
+        self.logger.info(f"Resuming the submission of {len(documents)} pending monitoring requests")
+        for start in range(0, len(documents), self.MAX_BULK_SIZE):
+            batch = documents[start:start + self.MAX_BULK_SIZE]
+            request_ids = [document["request_id"] for document in batch]
+            try:
+                self.job_manager.submit(
+                    lambda job, batch=batch: self.process_monitoring_requests(job, batch), request_ids=request_ids
+                )
+            except QueueFullError as e:
+                self.logger.error(f"Removing {len(request_ids)} pending monitoring requests: {e}")
+                self.request_store.delete_many(request_ids)
 
     def _set_routes(self):
         self.app.add_url_rule(
@@ -73,60 +106,279 @@ class RequestTranslator:
             self.delete_monitoring_request,
             methods=["DELETE"],
         )
+        self.app.add_url_rule(
+            "/api/monitoring-requests/bulk",
+            "submit_monitoring_requests",
+            self.submit_monitoring_requests,
+            methods=["POST"],
+        )
+        self.app.add_url_rule(
+            "/api/monitoring-requests/bulk/delete",
+            "delete_monitoring_requests",
+            self.delete_monitoring_requests,
+            methods=["POST"],
+        )
+        self.app.add_url_rule(
+            "/api/service-orchestrator/cache/invalidate",
+            "invalidate_service_orchestrator_cache",
+            self.invalidate_service_orchestrator_cache,
+            methods=["POST"],
+        )
+        self.app.add_url_rule("/api/jobs/<job_id>", "get_job", self.get_job, methods=["GET"])
         self.app.add_url_rule("/api/health", "health_check", self.health_check, methods=["GET"])
 
     def health_check(self):
         return jsonify({"status": "success", "message": "Request Translator is healthy"}), 200
 
     def submit_monitoring_request(self):
+        """
+        Validate a monitoring request and queue its translation and installation.
+        Returns 202 with the job_id to poll at /api/jobs/<job_id>.
+        """
         data = request.get_json()
         try:
-            validate(instance=data, schema=self.schema)
+            self.request_validator.validate(data)
             if not self.kpi_manager.is_kpi_supported(data):
                 return jsonify({"status": "error", "message": "KPI is not supported"}), 400
 
             request_id = shortuuid.uuid()  # Generate a unique request_id
-            self.monitoring_requests[request_id] = data
-            directive = self.translation_manager.translate_request(data, request_id)
+            self.request_store.put(request_id, data, status="pending")
+            try:
+                job = self.job_manager.submit(
+                    lambda job: self.process_monitoring_request(job, request_id, data), request_id=request_id
+                )
+            except QueueFullError as e:
+                self.request_store.delete(request_id)
+                return jsonify({"status": "error", "message": str(e)}), 503, {"Retry-After": "5"}
 
-            if self.comm_manager.send_directive(directive):
-                return jsonify({"status": "success", "request_id": request_id}), 200
-            else:
-                self.monitoring_requests.pop(request_id)  # Remove the request if it fails to send to Monitoring Manager
-                return jsonify({"status": "error", "message": "Failed to submit monitoring request"}), 500
+            return (
+                jsonify({"status": "accepted", "request_id": request_id, "job_id": job.job_id}),
+                202,
+                {"Location": f"/api/jobs/{job.job_id}"},
+            )
         except ValidationError as e:
             return jsonify({"status": "error", "message": str(e)}), 400
 
+    def process_monitoring_request(self, job, request_id, data):
+        """
+        Translate a monitoring request and send its directive to the Monitoring Manager, run by a job worker.
+        """
+        try:
+            job.update(progress=0.1, message="Translating request")
+            directive = self.translation_manager.translate_request(data, request_id)
+
+            job.update(progress=0.5, message="Sending directive to Monitoring Manager")
+            if not self.comm_manager.send_directive(directive):
+                raise RuntimeError("Failed to send directive to Monitoring Manager")
+        except Exception:
+            self.request_store.delete(request_id)  # Remove the request if it fails to be installed
+            raise
+        self.request_store.update_status(request_id, "active")
+
+    def _get_bulk_items(self, field):
+        """
+        Returns the list in the field of the JSON body, or an error response.
+        """
+        items = (request.get_json(silent=True) or {}).get(field)
+        if not isinstance(items, list) or not items:
+            return None, (jsonify({"status": "error", "message": f"{field} must be a non-empty list"}), 400)
+        if len(items) > self.MAX_BULK_SIZE:
+            return None, (jsonify({"status": "error", "message": f"At most {self.MAX_BULK_SIZE} {field} per call"}), 400)
+        return items, None
+
+    @staticmethod
+    def _group_key(document):
+        return document["kpi_name"], document["scope_type"], document["scope_id"]
+
+    def submit_monitoring_requests(self):
+        """
+        Validate a list of monitoring requests, {"requests": [...]}, and queue a single job installing them.
+        Requests are grouped by KPI and scope, with one directive per group.
+        Returns 202 with the result of the validation of each request and the job_id to poll.
+        """
+        items, error = self._get_bulk_items("requests")
+        if error:
+            return error
+
+        results = []
+        accepted = {}  # {request_id: data}
+        for index, data in enumerate(items):
+            try:
+                self.request_validator.validate(data)
+            except ValidationError as e:
+                results.append({"index": index, "status": "error", "message": e.message})
+                continue
+            if not self.kpi_manager.is_kpi_supported(data):
+                results.append({"index": index, "status": "error", "message": "KPI is not supported"})
+                continue
+            request_id = shortuuid.uuid()
+            accepted[request_id] = data
+            results.append({"index": index, "status": "accepted", "request_id": request_id})
+
+        if not accepted:
+            return jsonify({"status": "error", "message": "No valid monitoring request", "results": results}), 400
+
+        documents = self.request_store.put_many(accepted, status="pending")
+        try:
+            job = self.job_manager.submit(
+                lambda job: self.process_monitoring_requests(job, documents), request_ids=list(accepted)
+            )
+        except QueueFullError as e:
+            self.request_store.delete_many(list(accepted))
+            return jsonify({"status": "error", "message": str(e)}), 503, {"Retry-After": "5"}
+
+        return (
+            jsonify({"status": "accepted", "job_id": job.job_id, "results": results}),
+            202,
+            {"Location": f"/api/jobs/{job.job_id}"},
+        )
+
+    def process_monitoring_requests(self, job, documents):
+        """
+        Translate and send one directive per (KPI, scope) group of requests, run by a job worker.
+        The job result is the status of each request: active or failed.
+        """
+        groups = {}  # {(kpi_name, scope_type, scope_id): [document]}
+        for document in documents:
+            groups.setdefault(self._group_key(document), []).append(document)
+
+        lookups = {}  # service orchestrator lookups, shared by all groups
+        statuses = {}
+        for done, group in enumerate(groups.values()):
+            request_ids = [document["request_id"] for document in group]
+            job.update(
+                progress=done / len(groups),
+                message=f"Installing group {done + 1}/{len(groups)} ({group[0]['kpi_name']}, {len(group)} requests)",
+            )
+            try:
+                directive = self.translation_manager.translate_requests(
+                    [document["data"] for document in group], request_ids, lookups
+                )
+                if not self.comm_manager.send_directive(directive):
+                    raise RuntimeError("Failed to send directive to Monitoring Manager")
+            except Exception as e:
+                self.logger.error(f"Failed to install {len(group)} {group[0]['kpi_name']} requests: {e}")
+                self.request_store.delete_many(request_ids)
+                statuses.update({request_id: f"failed: {e}" for request_id in request_ids})
+                continue
+            self.request_store.update_status_many(request_ids, "active")
+            statuses.update({request_id: "active" for request_id in request_ids})
+
+        job.update(result=statuses)
+        failed = sum(status != "active" for status in statuses.values())
+        if failed:
+            raise RuntimeError(f"{failed} of {len(statuses)} monitoring requests failed")
+
+    def delete_monitoring_requests(self):
+        """
+        Delete a list of monitoring requests, {"request_ids": [...]}, with one delete directive
+        per (KPI, scope) group. Returns the result of each request.
+        """
+        request_ids, error = self._get_bulk_items("request_ids")
+        if error:
+            return error
+
+        documents = self.request_store.get_many(request_ids)
+        results = {}
+        groups = {}  # {(kpi_name, scope_type, scope_id): [request_id]}
+        for request_id in request_ids:
+            document = documents.get(request_id)
+            if document is None:
+                results[request_id] = {"status": "error", "message": "Monitoring request not found"}
+            elif document["status"] == "pending":
+                results[request_id] = {"status": "error", "message": "Monitoring request is still being submitted"}
+            else:
+                groups.setdefault(self._group_key(document), []).append(request_id)
+
+        for (kpi_name, _, _), group in groups.items():
+            delete_directive = {"request_ids": group, "action": "delete", "kpi_name": kpi_name}
+            if self.comm_manager.send_delete_directive(delete_directive):
+                self.request_store.delete_many(group)
+                results.update({request_id: {"status": "success"} for request_id in group})
+            else:
+                message = "Failed to delete monitoring request"
+                results.update({request_id: {"status": "error", "message": message} for request_id in group})
+
+        return jsonify({"status": "success", "results": results}), 200
+
+    def invalidate_service_orchestrator_cache(self):
+        """
+        Drop the cached slice components, e.g. when a slice is redeployed.
+        Optional JSON body: {"slice_id": ..., "nf": ...}, everything is dropped by default.
+        """
+        data = request.get_json(silent=True) or {}
+        invalidated = self.service_orchestrator.invalidate(slice_id=data.get("slice_id"), nf=data.get("nf"))
+        return jsonify({"status": "success", "invalidated": invalidated}), 200
+
+    def get_job(self, job_id):
+        """
+        Retrieve the state and progress of a submission job
+        """
+        job = self.job_manager.get(job_id)
+        if job:
+            return jsonify({"status": "success", "job": job.to_dict()})
+        else:
+            return jsonify({"status": "error", "message": "Job not found"}), 404
+
     def get_monitoring_request(self, request_id):
         """
         Retrieve monitoring request by request_id
         """
-        request_data = self.monitoring_requests.get(request_id)
-        if request_data:
-            return jsonify({"status": "success", "request_id": request_id, "data": request_data})
+        document = self.request_store.get(request_id)
+        if document:
+            return jsonify(
+                {"status": "success", "request_id": request_id, "request_status": document["status"], "data": document["data"]}
+            )
         else:
             return jsonify({"status": "error", "message": "Monitoring request not found"}), 404
 
     def get_all_monitoring_requests(self):
-        # Return all monitoring requests
-        return jsonify({"status": "success", "data": self.monitoring_requests})
+        """
+        List monitoring requests, one page at a time.
+        Query parameters: kpi_name, scope_id, status (filters), page (from 1) and page_size.
+        """
+        try:
+            page = int(request.args.get("page", 1))
+            page_size = int(request.args.get("page_size", 100))
+        except ValueError:
+            return jsonify({"status": "error", "message": "page and page_size must be integers"}), 400
+        if page < 1 or not 1 <= page_size <= self.MAX_PAGE_SIZE:
+            return jsonify({"status": "error", "message": f"page must be >= 1 and page_size in [1, {self.MAX_PAGE_SIZE}]"}), 400
+
+        filters = {field: request.args.get(field) for field in ["kpi_name", "scope_id", "status"]}
+        documents, total = self.request_store.list(filters, page, page_size)
+        return jsonify(
+            {
+                "status": "success",
+                "data": {document["request_id"]: document["data"] for document in documents},
+                "page": page,
+                "page_size": page_size,
+                "total": total,
+            }
+        )
 
     def get_supported_kpis(self):
         return jsonify({"status": "success", "supported_kpis": self.kpi_manager.list_supported_kpis()})
 
-    def run(self, port):
-        self.app.run(debug=True, port=port, host="0.0.0.0")
+    def run(self, port, debug=True):
+        # with the reloader of debug mode, run() is also called in the monitor process, which never serves requests:
+        # only the serving process resumes the pending requests, so that they are not installed twice
+        if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+            self._resume_pending_requests()
+        self.app.run(debug=debug, port=port, host="0.0.0.0")
 
     def delete_monitoring_request(self, request_id):
         """
         Delete monitoring request by request_id
         """
-        if request_id in self.monitoring_requests:
-            request = self.monitoring_requests[request_id]
-            kpi_name = request["kpi"]["kpi_name"]
+        document = self.request_store.get(request_id)
+        if document and document["status"] == "pending":
+            return jsonify({"status": "error", "message": "Monitoring request is still being submitted"}), 409
+        if document:
+            kpi_name = document["kpi_name"]
             delete_directive = {"request_id": request_id, "action": "delete", "kpi_name": kpi_name}
             if self.comm_manager.send_delete_directive(delete_directive):
-                del self.monitoring_requests[request_id]
+                self.request_store.delete(request_id)
                 return jsonify({"status": "success", "message": "Monitoring request deleted"}), 200
             else:
                 return jsonify({"status": "error", "message": "Failed to delete monitoring request"}), 500
@@ -0,0 +1,36 @@
+from jsonschema import Draft7Validator
+from app.logger import setup_logger
+
+try:
+    import fastjsonschema
+except ImportError:
+    fastjsonschema = None
+
+
+class RequestValidator:
+    """
+    Validates monitoring requests against the JSON schema, compiled once at startup.
+    If fastjsonschema is installed, requests are first checked by a generated validator,
+    and jsonschema is only used to report the errors of invalid requests.
+    """
+
+    def __init__(self, schema, use_fastjsonschema=True):
+        self.logger = setup_logger("request_validator")
+        Draft7Validator.check_schema(schema)
+        self.validator = Draft7Validator(schema)
+        self.fast_validate = None
+        if use_fastjsonschema and fastjsonschema is not None:
+            self.fast_validate = fastjsonschema.compile(schema)
+            self.logger.info("Using the fastjsonschema validator")
+
+    def validate(self, instance):
+        """
+        Raises jsonschema.ValidationError if the instance is invalid.
+        """
+        if self.fast_validate is not None:
+            try:
+                self.fast_validate(instance)
+                return
+            except fastjsonschema.JsonSchemaException:
+                pass  # report the error found by jsonschema, like without fastjsonschema
+        self.validator.validate(instance)
@@ -1,22 +1,39 @@
 import json
 import requests
+import threading
 import time
+from requests.adapters import HTTPAdapter
 from app.logger import setup_logger
 
 
 class ServiceOrchestratorManager:
     """
     Class that interacts with the Service Orchestrator to retrieve information about the slice components.
+    Lookups are cached for cache_ttl seconds, failed lookups for negative_cache_ttl seconds,
+    and concurrent lookups of the same components share a single request.
+    Requests time out after timeout seconds.
     """
 
-    def __init__(self, service_orchestrator_uri):
+    def __init__(self, service_orchestrator_uri, cache_ttl=60, negative_cache_ttl=5, pool_size=10, timeout=5):
         self.service_orchestrator_uri = service_orchestrator_uri
         self.logger = setup_logger("service_orchestrator")
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=pool_size))
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=pool_size))
+
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.negative_cache_ttl = negative_cache_ttl
+        self.cache = {}  # {(slice_id, nf): (expiry, components)}, nf is None for all the NFs of a slice
+        self.in_flight = {}  # {(slice_id, nf): threading.Event}, lookups in progress
+        self.generations = {}  # {(slice_id, nf): int}, bumped by invalidate() to discard the lookups in progress
+        self.lock = threading.Lock()
+
         self.connect_to_service_orchestrator()
 
     def is_service_orchestrator_available(self):
         try:
-            response = requests.get(self.service_orchestrator_uri + "/api/health")
+            response = self.session.get(self.service_orchestrator_uri + "/api/health", timeout=self.timeout)
             return response.status_code == 200
         except requests.exceptions.RequestException:
             return False
@@ -35,9 +52,73 @@ class ServiceOrchestratorManager:
         self.logger.error(f"Could not connect to Service Orchestrator after {max_retries} attempts")
         exit(1)
 
+    def _cached(self, key, lookup):
+        """
+        Returns the cached result of lookup() for key, or runs it once for all concurrent callers.
+        """
+        while True:
+            with self.lock:
+                entry = self.cache.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    return entry[1]
+                event = self.in_flight.get(key)
+                if event is None:
+                    event = self.in_flight[key] = threading.Event()
+                    generation = self.generations.get(key, 0)
+                    break
+            # another thread is looking up the same key, then use its result
+            # (the lookup is bounded by the connect and read timeouts of the request)
+            if not event.wait(2 * self.timeout):
+                self.logger.error(f"Timed out waiting for the lookup of {key}")
+                return None
+
+        result = None
+        try:
+            result = lookup()
+        finally:
+            ttl = self.cache_ttl if result is not None else self.negative_cache_ttl
+            with self.lock:
+                # not cached if the key was invalidated during the lookup, the result may be stale
+                if ttl > 0 and self.generations.get(key, 0) == generation:
+                    self.cache[key] = (time.monotonic() + ttl, result)
+                del self.in_flight[key]
+            event.set()
+        return result
+
+    def invalidate(self, slice_id=None, nf=None):
+        """
+        Drop the cached components of a slice (slice_id) or of an NF (e.g. nf="smf" or nf="gnb"),
+        or everything by default. Filtering by NF drops the slices that contain this NF.
+        Returns the number of dropped entries.
+        """
+
+        def matches(key, components):
+            if slice_id is not None and key[0] != slice_id:
+                return False
+            if nf is None or key[1] == nf:
+                return True
+            # slice entries cache all the NFs of the slice, failed lookups may contain any NF
+            return key[1] is None and (components is None or any(pod.get("nf") == nf for pod in components))
+
+        with self.lock:
+            keys = [key for key, (_, components) in self.cache.items() if matches(key, components)]
+            for key in keys:
+                del self.cache[key]
+            # the components of a lookup in progress are not known yet
+            for key in set(keys).union(key for key in self.in_flight if matches(key, None)):
+                self.generations[key] = self.generations.get(key, 0) + 1
+        self.logger.info(f"Invalidated {len(keys)} cached lookups (slice_id={slice_id}, nf={nf})")
+        return len(keys)
+
     def get_slice_components(self, slice_id, nsi=None):
+        return self._cached((slice_id, None), lambda: self._get_slice_components(slice_id))
+
+    def get_gnb(self):
+        return self._cached((None, "gnb"), self._get_gnb)
+
+    def _get_slice_components(self, slice_id):
         try:
-            response = requests.get(self.service_orchestrator_uri + f"/slices/{slice_id}")
+            response = self.session.get(self.service_orchestrator_uri + f"/slices/{slice_id}", timeout=self.timeout)
             if response.status_code == 200:
                 self.logger.info(f"Successfully retrieved slice components for slice ID {slice_id}")
                 pods = response.json()["pods"]
@@ -49,9 +130,9 @@ class ServiceOrchestratorManager:
             self.logger.error(f"Error retrieving slice components: {str(e)}")
             return None
 
-    def get_gnb(self):
+    def _get_gnb(self):
         try:
-            response = requests.get(self.service_orchestrator_uri + "/get_gnb")
+            response = self.session.get(self.service_orchestrator_uri + "/get_gnb", timeout=self.timeout)
             if response.status_code == 200:
                 self.logger.info(f"Successfully retrieved gNB pod info")
                 pod = response.json()["pod"]
@@ -1,31 +1,30 @@
 from app.logger import setup_logger
+from app.kpi_manager import KPIManager
 from app.service_orchestrator import ServiceOrchestratorManager
 
 
 class TranslationManager:
-    def __init__(self, service_orchestrator: ServiceOrchestratorManager):
+    def __init__(self, service_orchestrator: ServiceOrchestratorManager, kpi_manager: KPIManager):
         self.logger = setup_logger("translation_manager")
         self.service_orchestrator = service_orchestrator
+        self.kpi_manager = kpi_manager
+
+        # component resolvers for the "scope" field of the KPI registry
+        self.scope_translators = {
+            "slice": self.translate_slice_components,
+            "gnb": self.translate_gnb_components,
+        }
 
     def translate_request(self, request, request_id):
         self.logger.info("Translating request...")
         kpi_name = request["kpi"]["kpi_name"]
 
-        if kpi_name == "slice_throughput":
-            components = self.translate_slice_throughput(request)
-
-        elif kpi_name == "mac_throughput":
-            components = self.translate_mac_throughput(request)
-
-        elif kpi_name == "number_ues":
-            components = self.translate_number_ues(request)
-
-        elif kpi_name == "saturation_percentage":
-            components = self.translate_saturation_percentage(request)
-
-        else:
+        kpi = self.kpi_manager.get_kpi(kpi_name)
+        if kpi is None:
             raise NotImplementedError(f"KPI '{kpi_name}' is not supported")
 
+        components = self.scope_translators[kpi["scope"]](request, kpi, {})
+
         directive = {
             "request_id": request_id,
             "kpi_name": kpi_name,
@@ -37,128 +36,93 @@ class TranslationManager:
         self.logger.debug(f"Translated directive: {directive}")
         return directive
 
-    def translate_slice_throughput(self, request):
+    def translate_requests(self, requests, request_ids, lookups=None):
         """
-        Translates a slice throughput request into metrics from SMF and UPF to monitor.
-        3GPP 28.554 Section 6.3.2 and 6.3.3
+        Translates requests for the same KPI into a single directive covering all of them.
+        lookups memoizes the service orchestrator lookups, and can be shared between batches
+        so that each slice (or the gNB) is only looked up once.
         """
-        self.logger.info("Translating slice throughput request...")
-        snssais = request["kpi"]["sub_counter"]["sub_counter_ids"]
-        self.logger.info(f"NSSAIs: {snssais}")
+        kpi_name = requests[0]["kpi"]["kpi_name"]
+        self.logger.info(f"Translating {len(requests)} {kpi_name} requests...")
 
-        components_to_monitor = []
+        kpi = self.kpi_manager.get_kpi(kpi_name)
+        if kpi is None:
+            raise NotImplementedError(f"KPI '{kpi_name}' is not supported")
+        if lookups is None:
+            lookups = {}
 
-        # get pod_info for the NFs by interacting with the service orchestrator
-        for snssai in snssais:
-            pod_infos = self.service_orchestrator.get_slice_components(snssai)
-            self.logger.info(f"Pod info for SNSSAI {snssai}: {pod_infos}")
+        components = {}  # {pod_name: component_info}
+        for request in requests:
+            for component in self.scope_translators[kpi["scope"]](request, kpi, lookups):
+                components.setdefault(component["pod_name"], component)
 
-        for pod_info in pod_infos:
-            component_info = {}
-            if pod_info["nf"] == "smf":
-                component_info["type"] = "pod"
-                component_info["nf"] = "smf"
-                component_info["nss"] = pod_info["nss"]
-                component_info["pod_name"] = pod_info["name"]
-                component_info["pod_ip"] = pod_info["pod_ip"]
-                component_info["metrics"] = ["fivegs_smffunction_sm_seid_session"]
-                components_to_monitor.append(component_info)
-
-            elif pod_info["nf"] == "upf":
-                component_info["type"] = "pod"
-                component_info["nf"] = "upf"
-                component_info["nss"] = pod_info["nss"]
-                component_info["pod_name"] = pod_info["name"]
-                component_info["pod_ip"] = pod_info["pod_ip"]
-                component_info["metrics"] = [
-                    "fivegs_ep_n3_gtp_outdatavolumen3upf_seid_total",
-                    "fivegs_ep_n3_gtp_outdatavolumen3upf_seid_total",
-                ]
-                pod_info["metrics"] = [
-                    "fivegs_ep_n3_gtp_outdatavolumen3upf_seid_total",
-                    "fivegs_ep_n3_gtp_outdatavolumen3upf_seid_total",
-                ]
-                components_to_monitor.append(component_info)
+        directive = {
+            "request_ids": list(request_ids),
+            "kpi_name": kpi_name,
+            "action": "create",
+            "components": list(components.values()),
+            "interval": min(request["monitoring_interval"]["interval_seconds"] for request in requests),
+        }
 
-        self.logger.debug(f"Components to monitor: {components_to_monitor}")
-        return components_to_monitor
+        self.logger.debug(f"Translated directive: {directive}")
+        return directive
 
-    def translate_mac_throughput(self, request):
+    def translate_slice_components(self, request, kpi, lookups):
         """
-        Translates a MAC throughput request into metrics from gNB to monitor.
+        Translates a slice-scoped request (e.g. slice throughput, 3GPP 28.554 Section 6.3.2 and 6.3.3)
+        into the metrics to monitor on the NFs of each requested slice.
         """
-        self.logger.info("Translating MAC throughput request...")
+        self.logger.info(f"Translating {kpi['kpi_name']} request...")
+        snssais = request["kpi"]["sub_counter"]["sub_counter_ids"]
+        self.logger.info(f"NSSAIs: {snssais}")
 
-        components_to_monitor = []
+        components_to_monitor = {}  # {pod_name: component_info}
 
-        # get pod_info for the gNB by interacting with the service orchestrator
-        pod_info = self.service_orchestrator.get_gnb()
-        self.logger.info(f"Pod info for gNB: {pod_info}")
+        # get pod_info for the NFs by interacting with the service orchestrator
+        for snssai in snssais:
+            if ("slice", snssai) not in lookups:
+                lookups[("slice", snssai)] = self.service_orchestrator.get_slice_components(snssai)
+            pod_infos = lookups[("slice", snssai)]
+            if pod_infos is None:
+                raise RuntimeError(f"Could not retrieve the components of slice {snssai} from the Service Orchestrator")
+            self.logger.info(f"Pod info for SNSSAI {snssai}: {pod_infos}")
 
-        component_info = {}
-        component_info["type"] = "pod"
-        component_info["nf"] = "gnb"
-        component_info["nss"] = "edge"
-        component_info["pod_name"] = pod_info["name"]
-        component_info["pod_ip"] = pod_info["pod_ip"]
-        component_info["metrics"] = [
-            "oai_gnb_mac_tx_bytes",
-            "oai_gnb_mac_rx_bytes"
-            ]
-        components_to_monitor.append(component_info)
+            for pod_info in pod_infos:
+                metrics = kpi["metrics"].get(pod_info["nf"])
+                if metrics and pod_info["name"] not in components_to_monitor:
+                    components_to_monitor[pod_info["name"]] = self._component_info(pod_info, metrics)
 
+        components_to_monitor = list(components_to_monitor.values())
         self.logger.debug(f"Components to monitor: {components_to_monitor}")
         return components_to_monitor
-    
-    def translate_number_ues(self, request):
+
+    def translate_gnb_components(self, request, kpi, lookups):
         """
-        Translates a Number of connected UEs request into metrics from gNB to monitor.
+        Translates a gNB-scoped request (e.g. MAC throughput, number of UEs, PRB saturation)
+        into the metrics to monitor on the gNB.
         """
-        self.logger.info("Translating Number of connected UEs request...")
-
-        components_to_monitor = []
+        self.logger.info(f"Translating {kpi['kpi_name']} request...")
 
         # get pod_info for the gNB by interacting with the service orchestrator
-        pod_info = self.service_orchestrator.get_gnb()
+        if ("gnb",) not in lookups:
+            lookups[("gnb",)] = self.service_orchestrator.get_gnb()
+        pod_info = lookups[("gnb",)]
+        if pod_info is None:
+            raise RuntimeError("Could not retrieve the gNB from the Service Orchestrator")
         self.logger.info(f"Pod info for gNB: {pod_info}")
 
-        component_info = {}
-        component_info["type"] = "pod"
-        component_info["nf"] = "gnb"
-        component_info["nss"] = "edge"
-        component_info["pod_name"] = pod_info["name"]
-        component_info["pod_ip"] = pod_info["pod_ip"]
-        component_info["metrics"] = [
-            "oai_gnb_mac_tx_bytes"
-            ]
-        components_to_monitor.append(component_info)
+        pod_info = dict(pod_info, nf="gnb", nss="edge")
+        components_to_monitor = [self._component_info(pod_info, kpi["metrics"]["gnb"])]
 
         self.logger.debug(f"Components to monitor: {components_to_monitor}")
         return components_to_monitor
-    
-    def translate_saturation_percentage(self, request):
-        """
-        Translates a PRB Saturaion percentage request into metrics from gNB to monitor.
-        """
-        self.logger.info("Translating PRB Saturaion percentage request...")
-
-        components_to_monitor = []
 
-        # get pod_info for the gNB by interacting with the service orchestrator
-        pod_info = self.service_orchestrator.get_gnb()
-        self.logger.info(f"Pod info for gNB: {pod_info}")
-
-        component_info = {}
-        component_info["type"] = "pod"
-        component_info["nf"] = "gnb"
-        component_info["nss"] = "edge"
-        component_info["pod_name"] = pod_info["name"]
-        component_info["pod_ip"] = pod_info["pod_ip"]
-        component_info["metrics"] = [
-            "oai_gnb_mac_nprb",
-            "oai_gnb_l1_total_prbs"
-            ]
-        components_to_monitor.append(component_info)
-
-        self.logger.debug(f"Components to monitor: {components_to_monitor}")
-        return components_to_monitor
\ No newline at end of file
+    def _component_info(self, pod_info, metrics):
+        return {
+            "type": "pod",
+            "nf": pod_info["nf"],
+            "nss": pod_info["nss"],
+            "pod_name": pod_info["name"],
+            "pod_ip": pod_info["pod_ip"],
+            "metrics": list(metrics),
+        }
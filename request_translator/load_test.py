@@ -0,0 +1,128 @@
+"""
+Load generator for the request translator.
+
+validation: measures the per-request validation overhead in-process, with the schema rebuilt on every
+request (jsonschema.validate, as before), compiled once (Draft7Validator) and generated (fastjsonschema).
+http: sends concurrent monitoring requests to a running request translator and reports the latency
+percentiles and throughput of the API.
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from jsonschema import validate, ValidationError
+from dotenv import load_dotenv
+from app.request_validator import RequestValidator, fastjsonschema
+
+load_dotenv()
+MONARCH_REQUEST_TRANSLATOR_URI = os.getenv("MONARCH_REQUEST_TRANSLATOR_URI", "http://127.0.0.1:5000")
+
+
+def load_requests(json_files):
+    monitoring_requests = []
+    for json_file in json_files:
+        with open(json_file, "r") as file:
+            monitoring_requests.append(json.load(file))
+    return monitoring_requests
+
+
+def percentiles(values):
+    """
+    Returns {50: p50, 95: p95, 99: p99} of the values.
+    """
+    cut_points = statistics.quantiles(values, n=100, method="inclusive")
+    return {p: cut_points[p - 1] for p in [50, 95, 99]}
+
+
+def time_validation(validate_fn, monitoring_requests, iterations):
+    """
+    Returns the per-request validation times in microseconds.
+    """
+    timings = []
+    for i in range(iterations):
+        monitoring_request = monitoring_requests[i % len(monitoring_requests)]
+        start = time.perf_counter()
+        try:
+            validate_fn(monitoring_request)
+        except ValidationError:
+            pass
+        timings.append((time.perf_counter() - start) * 1e6)
+    return timings
+
+
+def run_validation(args):
+    with open("app/schema.json", "r") as file:
+        schema = json.load(file)
+    monitoring_requests = load_requests(args.json_files)
+
+    validators = {
+        "jsonschema.validate": lambda instance: validate(instance=instance, schema=schema),
+        "Draft7Validator": RequestValidator(schema, use_fastjsonschema=False).validate,
+    }
+    if fastjsonschema is not None:
+        validators["fastjsonschema"] = RequestValidator(schema).validate
+
+    print(f"{'validator':>20s} | {'mean_us':>9s} | {'p50_us':>9s} | {'p99_us':>9s} | {'requests/s':>11s}")
+    for name, validate_fn in validators.items():
+        time_validation(validate_fn, monitoring_requests, min(args.iterations, 100))  # warm-up
+        timings = time_validation(validate_fn, monitoring_requests, args.iterations)
+        mean, timing_percentiles = statistics.fmean(timings), percentiles(timings)
+        print(
+            f"{name:>20s} | {mean:9.1f} | {timing_percentiles[50]:9.1f} | "
+            f"{timing_percentiles[99]:9.1f} | {1e6 / mean:11.0f}"
+        )
+
+
+def run_http(args):
+    monitoring_requests = load_requests(args.json_files)
+    submit_url = f"{MONARCH_REQUEST_TRANSLATOR_URI}/api/monitoring-requests"
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+
+    def submit(i):
+        start = time.perf_counter()
+        try:
+            status_code = session.post(submit_url, json=monitoring_requests[i % len(monitoring_requests)]).status_code
+        except requests.exceptions.RequestException:
+            status_code = "error"
+        return time.perf_counter() - start, status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(submit, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency * 1000 for latency, _ in results]
+    latency_percentiles = percentiles(latencies)
+    print(f"Sent {args.requests} requests to {submit_url} with concurrency {args.concurrency}")
+    print(f"Status codes: {dict(Counter(status_code for _, status_code in results))}")
+    print(f"Throughput: {args.requests / elapsed:.1f} requests/s")
+    print(
+        f"Latency: p50 {latency_percentiles[50]:.1f}ms, p95 {latency_percentiles[95]:.1f}ms, "
+        f"p99 {latency_percentiles[99]:.1f}ms, max {max(latencies):.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load generator for the request translator")
+    parser.add_argument("mode", choices=["validation", "http"], help="Measure the validation in-process, or load the HTTP API")
+    parser.add_argument(
+        "--json_files",
+        nargs="+",
+        default=["requests/request_slice.json", "requests/request_mac_throughput.json", "requests/request_invalid.json"],
+        help="Monitoring requests to send, in turn",
+    )
+    parser.add_argument("--iterations", type=int, default=10000, help="Number of validations per validator (validation mode)")
+    parser.add_argument("--requests", type=int, default=1000, help="Number of requests to send (http mode)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Number of concurrent clients (http mode)")
+
+    args = parser.parse_args()
+
+    if args.mode == "validation":
+        run_validation(args)
+    else:
+        run_http(args)
@@ -9,6 +9,11 @@ MONITORING_MANAGER_URI = os.getenv("MONITORING_MANAGER_URI", "http://localhost:6
 SERVICE_ORCHESTRATOR_URI = os.getenv("SERVICE_ORCHESTRATOR_URI", "http://localhost:5001")
 REQUEST_TRANSLATOR_PORT = int(os.getenv("REQUEST_TRANSLATOR_PORT", 7000))
 MONARCH_MONGO_URI = os.getenv("MONARCH_MONGO_URI", "mongodb://localhost:27017/")
+REQUEST_CACHE_SIZE = int(os.getenv("REQUEST_CACHE_SIZE", 1024))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", 1000))
+SERVICE_ORCHESTRATOR_CACHE_TTL = float(os.getenv("SERVICE_ORCHESTRATOR_CACHE_TTL", 60))
+SERVICE_ORCHESTRATOR_TIMEOUT = float(os.getenv("SERVICE_ORCHESTRATOR_TIMEOUT", 5))
 DEFAULT_SLICE_COMPONENTS_FILE = "app/slice_components.json"
 
 
@@ -19,7 +24,16 @@ def main():
     logger.info(f"Monarch MongoDB URI: {MONARCH_MONGO_URI}")
     logger.info(f"Service Orchestrator URI: {SERVICE_ORCHESTRATOR_URI}")
 
-    app = RequestTranslator(MONITORING_MANAGER_URI, MONARCH_MONGO_URI, SERVICE_ORCHESTRATOR_URI)
+    app = RequestTranslator(
+        MONITORING_MANAGER_URI,
+        MONARCH_MONGO_URI,
+        SERVICE_ORCHESTRATOR_URI,
+        REQUEST_CACHE_SIZE,
+        JOB_WORKERS,
+        JOB_QUEUE_SIZE,
+        SERVICE_ORCHESTRATOR_CACHE_TTL,
+        SERVICE_ORCHESTRATOR_TIMEOUT,
+    )
     app.run(port=REQUEST_TRANSLATOR_PORT)
 
 
@@ -25,6 +25,16 @@ def test_submit(json_file_path):
     except ValueError:
         print(f"Non-JSON response (status={response.status_code}): {response.text}")
 
+def get_job(job_id):
+    # Send the GET request to retrieve the state of a submission job
+    job_url = f"{MONARCH_REQUEST_TRANSLATOR_URI}/api/jobs/{job_id}"
+    response = requests.get(job_url)
+
+    # Print the response from the server
+    print(f"Status Code: {response.status_code}")
+    print(f"Response: {response.json()}")
+
+
 def list_kpis():
     list_kpis_url = f"{MONARCH_REQUEST_TRANSLATOR_URI}/api/supported-kpis"
     response = requests.get(list_kpis_url)
@@ -60,13 +70,14 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Test the monitoring endpoint of the Flask API")
     parser.add_argument(
         "action",
-        choices=["submit", "list", "kpis", "delete"],
-        help="Action to perform: submit, list, delete, kpis (list supported KPIs)",
+        choices=["submit", "list", "kpis", "delete", "job"],
+        help="Action to perform: submit, list, delete, kpis (list supported KPIs), job (submission status)",
     )
     parser.add_argument(
         "--json_file", default="requests/request_slice.json", help="Path to the JSON file (only for submit action)"
     )
     parser.add_argument("--request_id", help="ID of the request to delete (only for delete action)")
+    parser.add_argument("--job_id", help="ID of the submission job (only for job action)")
 
     args = parser.parse_args()
 
@@ -76,6 +87,11 @@ if __name__ == "__main__":
         list_monitoring_requests()
     elif args.action == "kpis":
         list_kpis(args.url)
+    elif args.action == "job":
+        if args.job_id:
+            get_job(args.job_id)
+        else:
+            print("Error: --job_id is required for job action")
     elif args.action == "delete":
         if args.request_id:
             delete_monitoring_request(args.request_id)
@@ -0,0 +1,12 @@
+#!/bin/bash
+# The KPI registry is shared by the request translator, the monitoring manager and the KPI calculator.
+# Each component is built from its own directory, so the registry is copied into each of them.
+# request_translator/app/supported_kpis.json is the source of truth.
+SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+cd "$SCRIPT_DIR/.."
+REGISTRY="request_translator/app/supported_kpis.json"
+
+for target in monitoring_manager/app kpi_computation/standard/app; do
+    cp "$REGISTRY" "$target/supported_kpis.json"
+    echo "Copied $REGISTRY to $target/"
+done